@@ -7,10 +7,25 @@ import time
 import warnings
 import glob
 import base64
+import hashlib
+import io
 import re
 import csv
+import difflib
+import zlib
+import gzip
+import json
+import sqlite3
+import atexit
+import bisect
+import threading
+import queue
+import types
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import google.generativeai as genai
+import comic_pages
 
 # ==========================================
 # 🛠️ HELPER FUNCTION: SAVE CHARACTER
@@ -64,6 +79,10 @@ st.set_page_config(page_title="Joe's Comic Studio", page_icon="🦇", layout="wi
 # 1. DAD CONFIGURATION (EDIT THIS!)
 # ==========================================
 DAD_PASSWORD = "admin"  
+# Where the studio keeps its data: "csv" (loose files) or "sqlite" (one database
+# file). Switching to "sqlite" copies the existing CSVs + scripts in on first run.
+STORAGE_BACKEND = "csv"
+DB_FILE = "comic_studio.db"
 FLAGGED_WORDS = [
     "kill", "murder", "blood", "death", "stupid", "idiot", "hate", 
     "shut up", "damn", "hell", "die"
@@ -83,53 +102,269 @@ def get_time_remaining():
     return max(0, remaining)
 
 LOG_FILE = "security_log.csv"
+LOG_COLUMNS = ["Timestamp", "Type", "Input"]
 def log_security_event(event_type, user_input):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    if not os.path.exists(LOG_FILE):
-        with open(LOG_FILE, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Timestamp", "Type", "Input"])
-    with open(LOG_FILE, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([timestamp, event_type, user_input])
+    # Buffered: the journal's background thread writes these out in batches
+    get_journal().append(LOG_FILE, LOG_COLUMNS, {"Timestamp": timestamp, "Type": event_type, "Input": user_input}, buffered=True)
+
+# --- LOG ROTATION ---
+# security_log.csv only holds the newest segment. Once it passes LOG_ROTATE_BYTES
+# or its first entry is LOG_ROTATE_DAYS old, the journal gzips it into
+# LOG_ARCHIVE_DIR and records per-day / per-type counts in a small JSON index,
+# so the admin view can open just the archives that matter.
+LOG_ARCHIVE_DIR = "security_logs"
+LOG_INDEX_FILE = os.path.join(LOG_ARCHIVE_DIR, "index.json")
+LOG_ROTATE_BYTES = 256 * 1024
+LOG_ROTATE_DAYS = 7
+
+def load_log_index():
+    try:
+        with open(LOG_INDEX_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def log_needs_rotation(path):
+    if not os.path.exists(path): return False
+    if os.path.getsize(path) >= LOG_ROTATE_BYTES: return True
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        first = next(reader, None)
+    if not first: return False
+    try:
+        started = datetime.strptime(first.get("Timestamp", ""), "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return False
+    return (datetime.now() - started).days >= LOG_ROTATE_DAYS
+
+def rotate_security_log(path):
+    # Called by the journal (under its lock) right after a flush
+    if not log_needs_rotation(path): return False
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    dates, types, rows = {}, {}, 0
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            rows += 1
+            day = (row.get("Timestamp") or "")[:10]
+            dates[day] = dates.get(day, 0) + 1
+            types[row.get("Type", "")] = types.get(row.get("Type", ""), 0) + 1
+    # Microsecond stamp + counter; "x" mode means an existing archive is never overwritten
+    stamp, n = datetime.now().strftime('%Y%m%d_%H%M%S_%f'), 0
+    while True:
+        name = f"security_log_{stamp}{f'_{n}' if n else ''}.csv.gz"
+        try:
+            archive = gzip.open(os.path.join(LOG_ARCHIVE_DIR, name), "xb")
+            break
+        except FileExistsError:
+            n += 1
+    with open(path, "rb") as src, archive as dst:
+        shutil.copyfileobj(src, dst)
+    index = load_log_index()
+    index[name] = {"start": min(dates) if dates else "", "end": max(dates) if dates else "", "rows": rows, "dates": dates, "types": types}
+    with open(LOG_INDEX_FILE + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    os.replace(LOG_INDEX_FILE + ".tmp", LOG_INDEX_FILE)
+    os.remove(path)
+    return True
+
+def security_log_types():
+    get_journal().flush(LOG_FILE)
+    types = set()
+    for entry in load_log_index().values(): types.update(entry["types"])
+    if os.path.exists(LOG_FILE):
+        with open(LOG_FILE, newline="", encoding="utf-8") as f:
+            types.update(row.get("Type", "") for row in csv.DictReader(f))
+    return sorted(t for t in types if t)
+
+def read_security_log(event_type=None, include_archives=False):
+    # Newest segment only, unless archives are asked for; the index skips
+    # archives that never saw the requested event type.
+    get_journal().flush(LOG_FILE)
+    frames = []
+    index = load_log_index()
+    if include_archives:
+        for name in sorted(index):
+            if event_type and event_type not in index[name]["types"]: continue
+            frames.append(pd.read_csv(os.path.join(LOG_ARCHIVE_DIR, name), dtype=str, keep_default_na=False))
+    if os.path.exists(LOG_FILE):
+        frames.append(pd.read_csv(LOG_FILE, dtype=str, keep_default_na=False))
+    elif index and not include_archives:
+        # Just rotated -> the newest archive is the newest segment
+        frames.append(pd.read_csv(os.path.join(LOG_ARCHIVE_DIR, max(index)), dtype=str, keep_default_na=False))
+    if not frames: return None
+    df = pd.concat(frames, ignore_index=True)
+    if event_type: df = df[df["Type"] == event_type]
+    return df
+
+COPYRIGHT_TERMS = ["batman", "superman", "spiderman", "spider-man", "iron man", "hulk", "wonder woman", "captain america", "marvel", "dc comics"]
+# Extra terms, one per line ('#' = comment). Edited files are picked up on the next check.
+SAFETY_TERM_FILES = {"PROFANITY": ["banned_words.txt"], "COPYRIGHT": []}
+PII_PATTERNS = [
+    r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',                              # phone
+    r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b',          # email
+]
+# Highest priority first: if a message trips several rules, the first one wins
+SAFETY_RULES = {
+    "PII": ("PII_ATTEMPT", "⚠️ **SECURITY ALERT:** Secret Identity detected! That data has been redacted."),
+    "COPYRIGHT": ("COPYRIGHT_ATTEMPT", "🛑 **CREATIVE OVERRIDE:** That hero already exists! Invent someone new."),
+    "PROFANITY": ("PROFANITY_VIOLENCE", "🛡️ **HERO'S CODE VIOLATION:** That language violates the Code of Honor."),
+}
+
+class SafetyEngine:
+    # All categories are folded into ONE compiled regex (named group per
+    # category), so a message is scanned once no matter how many terms exist.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.signature = None
+        self.pattern = None
+        self.probe = None      # same rules, no groups, case-sensitive: run it on lower-cased text
+
+    def file_signature(self):
+        sig = []
+        for files in SAFETY_TERM_FILES.values():
+            for f in files:
+                try: sig.append((f, os.stat(f).st_mtime_ns))
+                except OSError: sig.append((f, None))
+        return tuple(sig)
+
+    def read_terms(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return [line.strip().lower() for line in f if line.strip() and not line.startswith("#")]
+        except OSError:
+            return []
+
+    def build(self):
+        terms = {"COPYRIGHT": list(COPYRIGHT_TERMS), "PROFANITY": list(FLAGGED_WORDS)}
+        for category, files in SAFETY_TERM_FILES.items():
+            for f in files: terms[category] += self.read_terms(f)
+        bodies = {"PII": "|".join(PII_PATTERNS)}
+        for category in ["COPYRIGHT", "PROFANITY"]:
+            # Longest first so "spider-man" wins over "spider"; allow simple endings (kills, killed, killer)
+            words = sorted({t for t in terms[category] if t}, key=len, reverse=True)
+            if words: bodies[category] = rf"\b(?:{'|'.join(re.escape(w) for w in words)})(?:s|es|d|ed|ing|er|ers)?\b"
+        pattern = re.compile("|".join(f"(?P<{c}>{b})" for c, b in bodies.items()), re.IGNORECASE)
+        probe = re.compile("|".join(f"(?:{b})" for b in bodies.values()))
+        return pattern, probe
+
+    def compiled(self):
+        sig = self.file_signature()
+        with self.lock:
+            if sig != self.signature:
+                self.pattern, self.probe = self.build()
+                self.signature = sig
+            return self.pattern
+
+    def scan(self, text):
+        # -> (category, (start, end)) for the highest-priority hit, or None
+        if not isinstance(text, str) or not text: return None
+        best = None
+        for m in self.compiled().finditer(text):
+            rank = list(SAFETY_RULES).index(m.lastgroup)
+            if best is None or rank < best[0]: best = (rank, m.lastgroup, m.span())
+            if rank == 0: break
+        return (best[1], best[2]) if best else None
+
+@st.cache_resource
+def get_safety_engine():
+    return SafetyEngine()
 
 def check_safety(user_input):
     if not isinstance(user_input, str): return True, ""
-    
-    phone_pattern = r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    
-    if re.search(phone_pattern, user_input) or re.search(email_pattern, user_input):
-        log_security_event("PII_ATTEMPT", user_input)
-        return False, "⚠️ **SECURITY ALERT:** Secret Identity detected! That data has been redacted."
-
-    copyrights = ["batman", "superman", "spiderman", "spider-man", "iron man", "hulk", "wonder woman", "captain america", "marvel", "dc comics"]
-    if any(c in user_input.lower() for c in copyrights):
-        log_security_event("COPYRIGHT_ATTEMPT", user_input)
-        return False, "🛑 **CREATIVE OVERRIDE:** That hero already exists! Invent someone new."
-
-    if any(w in user_input.lower() for w in FLAGGED_WORDS):
-        log_security_event("PROFANITY_VIOLENCE", user_input)
-        return False, "🛡️ **HERO'S CODE VIOLATION:** That language violates the Code of Honor."
-
-    return True, ""
+    hit = get_safety_engine().scan(user_input)
+    if not hit: return True, ""
+    event_type, message = SAFETY_RULES[hit[0]]
+    log_security_event(event_type, user_input)
+    return False, message
+
+# --- BULK SCREENING ---
+# Whole tables (imported rosters) and scripts are screened with ONE vectorized
+# str.contains per column using the engine's combined pattern; only the few
+# flagged cells are scanned again to find out which rule fired and where.
+SCRIPT_CHUNK_PATTERN = re.compile(r"\n\s*\n|(?=^\s*(?:\[PAGE\s*\d+\]|PANEL\s*\d+))", re.IGNORECASE | re.MULTILINE)
+SAFETY_LOG_SAMPLE = 5
+
+def split_script_panels(text):
+    if not isinstance(text, str): return []
+    return [chunk.strip() for chunk in SCRIPT_CHUNK_PATTERN.split(text) if chunk and chunk.strip()]
+
+def check_safety_batch(data, source="batch"):
+    engine = get_safety_engine()
+    df = pd.DataFrame({"Panel": list(data)}) if isinstance(data, (list, tuple)) else data
+    if df is None or df.empty: return []
+    engine.compiled()
+    findings = []
+    for col in df.columns:
+        values = df[col].astype(str)
+        # object dtype -> Python's re engine, which handles the big alternation faster than Arrow's
+        mask = values.str.lower().astype(object).str.contains(engine.probe, na=False)
+        for idx in mask[mask].index:
+            hit = engine.scan(values[idx])
+            if not hit: continue
+            row = df.at[idx, "Hero Name"] if "Hero Name" in df.columns else idx
+            findings.append({"row": row, "column": col, "category": hit[0], "span": hit[1], "text": values[idx]})
+    # One log line per category instead of one per cell
+    grouped = {}
+    for f in findings: grouped.setdefault(f["category"], []).append(f)
+    for category, hits in grouped.items():
+        where = ", ".join(f"{h['column']} @ {h['row']}" for h in hits[:SAFETY_LOG_SAMPLE])
+        more = f" (+{len(hits) - SAFETY_LOG_SAMPLE} more)" if len(hits) > SAFETY_LOG_SAMPLE else ""
+        log_security_event(SAFETY_RULES[category][0], f"[{source}] {len(hits)} flagged: {where}{more}")
+    return findings
+
+def remember_safety_findings(source, findings):
+    st.session_state.setdefault("safety_findings", {})[source] = findings
 
 # ==========================================
 # 3. VISUAL SETUP
 # ==========================================
 
-def get_img_as_base64(file):
+ASSET_DIR = os.path.join("static", "banners")
+ASSET_URL = "app/static/banners"
+BANNER_MAX_WIDTH = 1600
+
+# Banners are resized + recompressed ONCE per file version and written to the
+# static folder under a content-hashed name, so the browser can cache them.
+@st.cache_data(show_spinner=False)
+def build_banner_asset(file, mtime, max_width):
+    from PIL import Image
+    with open(file, "rb") as f:
+        data = f.read()
+    try:
+        img = Image.open(io.BytesIO(data)).convert("RGB")
+        if img.width > max_width:
+            img = img.resize((max_width, int(img.height * max_width / img.width)))
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=80, optimize=True, progressive=True)
+        if buf.tell() < len(data): data = buf.getvalue()
+    except Exception:
+        pass # Not an image Pillow understands -> ship the original bytes
+
+    stem = os.path.splitext(os.path.basename(file))[0]
+    asset_name = f"{stem}.{hashlib.sha1(data).hexdigest()[:12]}.jpg"
+    os.makedirs(ASSET_DIR, exist_ok=True)
+    if not os.path.exists(os.path.join(ASSET_DIR, asset_name)):
+        for old in glob.glob(os.path.join(ASSET_DIR, f"{stem}.*.jpg")): os.remove(old)
+        with open(os.path.join(ASSET_DIR, asset_name), "wb") as f:
+            f.write(data)
+
+    if st.get_option("server.enableStaticServing"):
+        return f"{ASSET_URL}/{asset_name}"
+    # Static serving switched off -> fall back to an (optimized, cached) data URI
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode()
+
+def get_banner_url(file):
     try:
-        with open(file, "rb") as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
-    except FileNotFoundError:
+        mtime = os.path.getmtime(file)
+    except OSError:
         return ""
+    return build_banner_asset(file, mtime, BANNER_MAX_WIDTH)
 
-banner_main_bg = get_img_as_base64("banner4.jpg")
-banner_char_bg = get_img_as_base64("banner3.jpg")
-banner_add_bg  = get_img_as_base64("banner7.jpg")
-banner_chat_bg = get_img_as_base64("banner8.jpg")
+banner_main_bg = get_banner_url("banner4.jpg")
+banner_char_bg = get_banner_url("banner3.jpg")
+banner_add_bg  = get_banner_url("banner7.jpg")
+banner_chat_bg = get_banner_url("banner8.jpg")
 
 st.markdown(f"""
 <style>
@@ -224,12 +459,15 @@ st.markdown(f"""
 # ==========================================
 PORTFOLIO_FILE = "portfolio.csv"
 TIMELINE_FILE = "timeline.csv"
-ROSTER_FILES = ["roster_completed.csv"]
+TIMELINE_COLUMNS = ["Year", "Event", "Type"]
+PORTFOLIO_COLUMNS = ["Title", "Issue", "Description", "Image_Path"]
+ROSTER_FILES = ["roster_completed.csv", "roster_examples.csv", "characters.csv"]
 IMAGE_DIR = "character_images"
 PORTFOLIO_DIR = "portfolio_images"
 SCRIPT_DIR = "saved_scripts"
+THUMB_DIR = "thumbnail_cache"
 
-for folder in [IMAGE_DIR, PORTFOLIO_DIR, SCRIPT_DIR]:
+for folder in [IMAGE_DIR, PORTFOLIO_DIR, SCRIPT_DIR, THUMB_DIR]:
     if not os.path.exists(folder):
         os.makedirs(folder)
 
@@ -244,17 +482,312 @@ FULL_CHAR_COLUMNS = [
     "Speaking Style", "Relationships", "Image_Path"
 ]
 
-def load_data(file_path, columns):
-    if not os.path.exists(file_path):
-        return pd.DataFrame(columns=columns)
-    try:
-        df = pd.read_csv(file_path)
+# --- ROSTER STORE ---
+# Every CSV is parsed ONCE and kept in memory (as text columns, blanks = "").
+# An entry is only re-parsed when that file's mtime or size changes. The store
+# lives in st.cache_resource, so all sessions share the same parsed copies.
+class RosterStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, file_path, columns):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return pd.DataFrame(columns=columns)
+        key = os.path.abspath(file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == signature:
+                self.hits += 1
+                return self.project(entry[1], columns)
+        df = self.parse(file_path)
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = (signature, df)
+        return self.project(df, columns)
+
+    def parse(self, file_path):
+        try:
+            return pd.read_csv(file_path, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+
+    def project(self, df, columns):
+        # Always hand out a fresh frame so callers can't mutate the cached one
+        df = df.copy()
         for col in columns:
             if col not in df.columns:
-                df[col] = "" 
+                df[col] = ""
+        return df[columns]
+
+    def invalidate(self, file_path):
+        with self.lock:
+            self.entries.pop(os.path.abspath(file_path), None)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"files": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+@st.cache_resource
+def get_roster_store():
+    return RosterStore()
+
+def load_data(file_path, columns):
+    if using_sqlite(): return get_sqlite_store().load(file_path, columns)
+    return get_roster_store().load(file_path, columns)
+
+# --- APPEND-ONLY JOURNAL ---
+# Inserts are a single CSV append (no read-concat-rewrite). A background thread
+# flushes buffered rows in batches and, every COMPACT_EVERY appends, rewrites a
+# table once through its compactor (e.g. sorting the timeline by Year).
+JOURNAL_FLUSH_SECONDS = 2
+JOURNAL_BATCH_SIZE = 50
+COMPACT_EVERY = 25
+
+class TableJournal:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.buffers = {}      # path -> rows waiting for the next batched flush
+        self.headers = {}      # path -> column order already on disk
+        self.appended = {}     # path -> rows appended since the last compaction
+        self.compactors = {}   # path -> function(df) -> df
+        self.rotators = {}     # path -> function(path), may archive the file away
+        self.wakeup = threading.Event()
+        threading.Thread(target=self.run, daemon=True).start()
+        atexit.register(self.flush_all)
+
+    def append(self, path, columns, row, buffered=False):
+        with self.lock:
+            if not buffered:
+                self.write_rows(path, columns, [row])
+                return
+            self.buffers.setdefault(path, (columns, []))[1].append(row)
+            if len(self.buffers[path][1]) >= JOURNAL_BATCH_SIZE: self.wakeup.set()
+
+    def write_rows(self, path, columns, rows):
+        # A missing or empty file (e.g. deleted by hand) gets its header written again
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        header = None if fresh else self.headers.get(path) or self.read_header(path)
+        if fresh: self.appended[path] = 0
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if not header:
+                header = columns
+                writer.writerow(header)
+            writer.writerows([[row.get(col, "") for col in header] for row in rows])
+        self.headers[path] = header
+        self.appended[path] = self.appended.get(path, 0) + len(rows)
+
+    def read_header(self, path):
+        if not os.path.exists(path) or os.path.getsize(path) == 0: return None
+        with open(path, "rb+") as f:
+            # Make sure we never glue a new row onto an unterminated last line
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) not in (b"\n", b"\r"): f.write(b"\r\n")
+        with open(path, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), None)
+
+    def flush(self, path):
+        with self.lock:
+            columns, rows = self.buffers.pop(path, (None, []))
+            if rows: self.write_rows(path, columns, rows)
+            if path in self.rotators and self.rotators[path](path):
+                self.headers.pop(path, None)
+                self.appended[path] = 0
+
+    def flush_all(self):
+        with self.lock:
+            for path in list(self.buffers): self.flush(path)
+
+    def compact(self, path):
+        with self.lock:
+            self.flush(path)
+            if not os.path.exists(path): return
+            try:
+                df = pd.read_csv(path, dtype=str, keep_default_na=False)
+            except pd.errors.EmptyDataError:
+                return
+            df = self.compactors[path](df)
+            df.to_csv(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+            self.headers[path] = list(df.columns)
+            self.appended[path] = 0
+
+    def run(self):
+        while True:
+            self.wakeup.wait(JOURNAL_FLUSH_SECONDS)
+            self.wakeup.clear()
+            try:
+                self.flush_all()
+                for path, count in list(self.appended.items()):
+                    if count >= COMPACT_EVERY and path in self.compactors: self.compact(path)
+            except Exception as e:
+                print(f"Journal error: {e}")
+
+def sort_timeline(df):
+    years = pd.to_numeric(df["Year"], errors="coerce")
+    return df.assign(_year=years).sort_values("_year", kind="stable", na_position="last").drop(columns="_year").reset_index(drop=True)
+
+@st.cache_resource
+def get_journal():
+    journal = TableJournal()
+    journal.compactors[TIMELINE_FILE] = sort_timeline
+    journal.compactors[PORTFOLIO_FILE] = lambda df: df.drop_duplicates(subset="Title", keep="first")
+    journal.rotators[LOG_FILE] = rotate_security_log
+    return journal
+
+# --- SQLITE BACKEND ---
+# Optional (STORAGE_BACKEND = "sqlite"). WAL mode lets sessions read while
+# another one writes, every save is a single-row transaction, and heroes,
+# universes and years are indexed, so lookups/deletes don't scan whole files.
+CHAR_SQL_COLUMNS = {col: re.sub(r"\W+", "_", col.lower()) for col in FULL_CHAR_COLUMNS}
+
+class SQLiteStore:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        char_cols = ", ".join(f"{c} TEXT" for c in CHAR_SQL_COLUMNS.values())
+        with self.connect() as con:
+            con.executescript(f"""
+                CREATE TABLE IF NOT EXISTS characters (universe_file TEXT NOT NULL, {char_cols},
+                    PRIMARY KEY (universe_file, hero_name));
+                CREATE INDEX IF NOT EXISTS idx_characters_hero ON characters(hero_name);
+                CREATE INDEX IF NOT EXISTS idx_characters_universe ON characters(universe);
+                CREATE TABLE IF NOT EXISTS timeline (id INTEGER PRIMARY KEY AUTOINCREMENT, year INTEGER, event TEXT, type TEXT);
+                CREATE INDEX IF NOT EXISTS idx_timeline_year ON timeline(year);
+                CREATE TABLE IF NOT EXISTS portfolio (title TEXT PRIMARY KEY, issue TEXT, description TEXT, image_path TEXT);
+                CREATE TABLE IF NOT EXISTS scripts (filename TEXT PRIMARY KEY, content TEXT, updated_at TEXT);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """)
+        self.migrate_from_csv()
+
+    def connect(self):
+        # One connection per thread (Streamlit runs each session on its own thread)
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+        return con
+
+    def write(self, con, sql, params):
+        if con is not None: return con.execute(sql, params) # part of a bigger transaction
+        with self.connect() as c:
+            return c.execute(sql, params)
+
+    def migrate_from_csv(self):
+        con = self.connect()
+        if con.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone(): return
+        store = RosterStore()
+        with con:
+            for f in glob.glob("universe_*.csv"):
+                for row in store.load(f, FULL_CHAR_COLUMNS).to_dict("records"):
+                    self.upsert_character(f, row, con)
+            for row in store.load(TIMELINE_FILE, TIMELINE_COLUMNS).to_dict("records"):
+                self.add_timeline_event(row["Year"], row["Event"], row["Type"], con)
+            for row in store.load(PORTFOLIO_FILE, PORTFOLIO_COLUMNS).to_dict("records"):
+                self.add_portfolio_entry(row, con)
+            for path in glob.glob(os.path.join(SCRIPT_DIR, "*.txt")):
+                with open(path, "r", encoding="utf-8") as f:
+                    self.save_script(os.path.basename(path), f.read(), con)
+            con.execute("INSERT INTO meta VALUES ('migrated', ?)", (datetime.now().isoformat(),))
+
+    def load(self, file_path, columns):
+        if file_path == TIMELINE_FILE:
+            sql, names = "SELECT year, event, type FROM timeline ORDER BY year, id", TIMELINE_COLUMNS
+        elif file_path == PORTFOLIO_FILE:
+            sql, names = "SELECT title, issue, description, image_path FROM portfolio ORDER BY rowid", PORTFOLIO_COLUMNS
+        else:
+            sql = f"SELECT {', '.join(CHAR_SQL_COLUMNS.values())} FROM characters WHERE universe_file = ? ORDER BY rowid"
+            names = FULL_CHAR_COLUMNS
+        rows = self.connect().execute(sql, (file_path,) if "?" in sql else ()).fetchall()
+        df = pd.DataFrame(rows, columns=names).fillna("").astype(str)
+        for col in columns:
+            if col not in df.columns: df[col] = ""
         return df[columns]
-    except pd.errors.EmptyDataError:
-        return pd.DataFrame(columns=columns)
+
+    def list_universe_files(self):
+        return [r[0] for r in self.connect().execute("SELECT DISTINCT universe_file FROM characters ORDER BY universe_file")]
+
+    def upsert_character(self, universe_file, data, con=None):
+        cols = list(CHAR_SQL_COLUMNS.values())
+        values = [None if data.get(col) is None else str(data.get(col)) for col in FULL_CHAR_COLUMNS]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in cols if c not in ("hero_name", "image_path"))
+        # A save without a new upload keeps the hero's existing picture
+        self.write(con, f"""INSERT INTO characters (universe_file, {', '.join(cols)}) VALUES (?{', ?' * len(cols)})
+                               ON CONFLICT (universe_file, hero_name) DO UPDATE SET {updates},
+                               image_path = COALESCE(excluded.image_path, characters.image_path)""",
+                   [universe_file] + values)
+
+    def write_universe_batch(self, universe_file, rows, removed_names):
+        with self.connect() as con:
+            for row in rows.to_dict("records"): self.upsert_character(universe_file, row, con)
+            con.executemany("DELETE FROM characters WHERE universe_file = ? AND hero_name = ?",
+                            [(universe_file, name) for name in removed_names])
+
+    def delete_character(self, universe_file, hero_name):
+        return self.write(None, "DELETE FROM characters WHERE universe_file = ? AND hero_name = ?", (universe_file, hero_name)).rowcount > 0
+
+    def add_timeline_event(self, year, event, type, con=None):
+        self.write(con, "INSERT INTO timeline (year, event, type) VALUES (?, ?, ?)", (year, event, type))
+
+    def add_portfolio_entry(self, row, con=None):
+        self.write(con, "INSERT OR IGNORE INTO portfolio VALUES (?, ?, ?, ?)", [row.get(col) for col in PORTFOLIO_COLUMNS])
+
+    def save_script(self, filename, content, con=None):
+        self.write(con, "INSERT OR REPLACE INTO scripts VALUES (?, ?, ?)", (filename, content, datetime.now().isoformat()))
+
+    def load_script(self, filename):
+        row = self.connect().execute("SELECT content FROM scripts WHERE filename = ?", (filename,)).fetchone()
+        return row[0] if row else ""
+
+    def list_scripts(self):
+        return [r[0] for r in self.connect().execute("SELECT filename FROM scripts ORDER BY filename")]
+
+    def delete_script(self, filename):
+        self.write(None, "DELETE FROM scripts WHERE filename = ?", (filename,))
+
+def using_sqlite():
+    return STORAGE_BACKEND == "sqlite"
+
+@st.cache_resource
+def get_sqlite_store():
+    return SQLiteStore(DB_FILE)
+
+def list_universe_files():
+    if using_sqlite(): return get_sqlite_store().list_universe_files()
+    return sorted(glob.glob("universe_*.csv"))
+
+# --- CHARACTER VAULT ---
+ALL_UNIVERSES = "🌌 All Universes"
+VAULT_PAGE_SIZES = [6, 12, 24, 48]
+VAULT_SEARCH_COLUMNS = ["Hero Name", "Role", "Universe"]
+
+def load_vault(files):
+    frames = [load_data(f, FULL_CHAR_COLUMNS).assign(_source_file=f) for f in files]
+    if not frames: return pd.DataFrame(columns=FULL_CHAR_COLUMNS + ["_source_file"])
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+def filter_vault(df, query="", role=None):
+    if df.empty: return df
+    mask = pd.Series(True, index=df.index)
+    if query:
+        hits = [df[col].astype(str).str.contains(query, case=False, regex=False, na=False) for col in VAULT_SEARCH_COLUMNS]
+        mask &= pd.concat(hits, axis=1).any(axis=1)
+    if role: mask &= df["Role"] == role
+    return df[mask]
+
+def list_script_files():
+    if using_sqlite(): return get_sqlite_store().list_scripts()
+    return [os.path.basename(s) for s in glob.glob(os.path.join(SCRIPT_DIR, "*.txt"))]
 
 def save_image(image_file, folder, alias):
     if image_file is None:
@@ -267,8 +800,91 @@ def save_image(image_file, folder, alias):
         f.write(image_file.getbuffer())
     return path
 
+# --- THUMBNAILS ---
+# Character art is ~2 MB per PNG. The grids show small WebP copies instead,
+# one per size bucket, keyed on source path + mtime + size (so edits re-render).
+THUMB_SIZES = [320, 640, 1024]
+THUMB_CACHE_BUDGET_MB = 100
+VAULT_THUMB_WIDTH = 640
+GALLERY_THUMB_WIDTH = 320
+
+def cloud_image_path(raw_path, folder):
+    # Paths in the CSVs may have Windows slashes -> always look inside `folder`
+    filename = os.path.basename(str(raw_path).replace("\\", "/"))
+    return f"{folder}/{filename}"
+
+def get_thumbnail(src_path, width=VAULT_THUMB_WIDTH):
+    try:
+        src_stat = os.stat(src_path)
+    except OSError:
+        return src_path
+    bucket = next((b for b in THUMB_SIZES if b >= width), THUMB_SIZES[-1])
+    key = f"{os.path.abspath(src_path)}|{src_stat.st_mtime_ns}|{src_stat.st_size}|{bucket}"
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    thumb_base = os.path.join(THUMB_DIR, f"{stem}_{bucket}_{hashlib.sha1(key.encode()).hexdigest()[:16]}")
+
+    for ext in (".webp", ".jpg"):
+        if os.path.exists(thumb_base + ext):
+            # Bump the LRU clock (at most once an hour, so reruns stay read-only)
+            if time.time() - os.path.getmtime(thumb_base + ext) > 3600: os.utime(thumb_base + ext)
+            return thumb_base + ext
+
+    try:
+        thumb_path = render_thumbnail(src_path, thumb_base, bucket)
+    except Exception as e:
+        print(f"Thumbnail failed for {src_path}: {e}")
+        return src_path
+    enforce_thumbnail_budget()
+    return thumb_path
+
+def render_thumbnail(src_path, thumb_base, bucket):
+    from PIL import Image
+    with Image.open(src_path) as img:
+        img.thumbnail((bucket, bucket * 2))
+        if img.mode not in ("RGB", "RGBA"): img = img.convert("RGBA")
+        # Write to a temp name + rename so other sessions never see half a file
+        try:
+            img.save(thumb_base + ".tmp", "WEBP", quality=80, method=4)
+            thumb_path = thumb_base + ".webp"
+        except (KeyError, OSError):
+            img.convert("RGB").save(thumb_base + ".tmp", "JPEG", quality=85, optimize=True)
+            thumb_path = thumb_base + ".jpg"
+    os.replace(thumb_base + ".tmp", thumb_path)
+    return thumb_path
+
+def enforce_thumbnail_budget(budget_mb=THUMB_CACHE_BUDGET_MB):
+    # Least-recently-used thumbnails go first once the folder is over budget
+    entries = []
+    for entry in os.scandir(THUMB_DIR):
+        if entry.is_file(): entries.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= budget_mb * 1024 * 1024: break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError: pass
+
+def warm_thumbnail_cache():
+    count = 0
+    for f in list_universe_files():
+        for raw_path in load_data(f, FULL_CHAR_COLUMNS)["Image_Path"]:
+            path = cloud_image_path(raw_path, IMAGE_DIR)
+            if os.path.isfile(path):
+                get_thumbnail(path, VAULT_THUMB_WIDTH)
+                count += 1
+    for raw_path in load_data(PORTFOLIO_FILE, PORTFOLIO_COLUMNS)["Image_Path"]:
+        path = cloud_image_path(raw_path, PORTFOLIO_DIR)
+        if os.path.isfile(path):
+            get_thumbnail(path, GALLERY_THUMB_WIDTH)
+            count += 1
+    return count
+
 def delete_character(universe, alias):
-    target_file = get_universe_filename(universe)
+    # Accepts a universe name ("Home") or its file ("universe_home.csv")
+    target_file = universe if universe.endswith(".csv") else get_universe_filename(universe)
+    get_search_index().remove("character", f"{target_file}|{alias}")
+    if using_sqlite(): return get_sqlite_store().delete_character(target_file, alias)
     if not os.path.exists(target_file): return False
     df = pd.read_csv(target_file)
     if df.empty: return False
@@ -283,15 +899,7 @@ def save_character(filename, data_dict, uploaded_image):
     import pandas as pd
     import os
 
-    # 1. Load the current Excel file
-    if os.path.exists(filename):
-        df = pd.read_excel(filename)
-    else:
-        # If file is missing, start a new one
-        # We assume FULL_CHAR_COLUMNS is defined globally
-        df = pd.DataFrame(columns=FULL_CHAR_COLUMNS)
-
-    # 2. Handle the Image Upload
+    # 1. Handle the Image Upload
     if uploaded_image is not None:
         # Make sure the folder exists
         if not os.path.exists("character_images"):
@@ -310,22 +918,40 @@ def save_character(filename, data_dict, uploaded_image):
         # If no image uploaded, keep it empty
         data_dict['Image_Path'] = None
 
-    # 3. Add the New Hero to the List
+    # 2. Database backend: one upsert, no file rewrite
+    if using_sqlite() and filename.endswith(".csv"):
+        get_sqlite_store().upsert_character(filename, data_dict)
+        index_character(filename, data_dict)
+        return
+
+    # 3. Load the current file (universe CSV, or the Excel save file)
+    if filename.endswith(".csv"):
+        df = load_data(filename, FULL_CHAR_COLUMNS)
+    elif os.path.exists(filename):
+        df = pd.read_excel(filename)
+    else:
+        # If file is missing, start a new one
+        # We assume FULL_CHAR_COLUMNS is defined globally
+        df = pd.DataFrame(columns=FULL_CHAR_COLUMNS)
+
+    # 4. Add the New Hero to the List (an edit replaces the old entry)
+    if data_dict.get('Hero Name') in df['Hero Name'].values:
+        old = df[df['Hero Name'] == data_dict['Hero Name']].iloc[0]
+        if data_dict['Image_Path'] is None: data_dict['Image_Path'] = old['Image_Path']
+        df = df[df['Hero Name'] != data_dict['Hero Name']]
     new_row = pd.DataFrame([data_dict])
     df = pd.concat([df, new_row], ignore_index=True)
     
-    # 4. Save the updated list back to Excel
-    df.to_excel(filename, index=False)
+    # 5. Save the updated list back
+    if filename.endswith(".csv"): df.to_csv(filename, index=False)
+    else: df.to_excel(filename, index=False)
+    index_character(filename, data_dict)
 
 def save_timeline_event(year, event, type):
-    df = load_data(TIMELINE_FILE, ["Year", "Event", "Type"])
-    new_entry = pd.DataFrame([{ "Year": year, "Event": event, "Type": type }])
-    df = pd.concat([df, new_entry], ignore_index=True)
-    try:
-        df["Year"] = df["Year"].astype(int)
-        df = df.sort_values(by="Year")
-    except: pass 
-    df.to_csv(TIMELINE_FILE, index=False)
+    get_search_index().put("timeline", *timeline_document(year, event))
+    if using_sqlite(): return get_sqlite_store().add_timeline_event(year, event, type)
+    # O(1) append; sorting by Year happens in the journal's background compaction
+    get_journal().append(TIMELINE_FILE, TIMELINE_COLUMNS, {"Year": year, "Event": event, "Type": type})
 
 def save_portfolio_entry(title, issue_num, description, image_file=None, local_path=None):
     final_path = None
@@ -336,136 +962,1309 @@ def save_portfolio_entry(title, issue_num, description, image_file=None, local_p
         target = os.path.join(PORTFOLIO_DIR, filename)
         if not os.path.exists(target): shutil.copy(local_path, target)
         final_path = target
-    df = load_data(PORTFOLIO_FILE, ["Title", "Issue", "Description", "Image_Path"])
-    if not df.empty and title in df["Title"].values: return
-    new_entry = pd.DataFrame([{"Title": title, "Issue": issue_num, "Description": description, "Image_Path": final_path}])
-    df = pd.concat([df, new_entry], ignore_index=True)
-    df.to_csv(PORTFOLIO_FILE, index=False)
+    entry = {"Title": title, "Issue": issue_num, "Description": description, "Image_Path": final_path or ""}
+    if using_sqlite():
+        get_sqlite_store().add_portfolio_entry(entry)
+    else:
+        df = load_data(PORTFOLIO_FILE, PORTFOLIO_COLUMNS)
+        if not df.empty and title in df["Title"].values: return
+        get_journal().append(PORTFOLIO_FILE, PORTFOLIO_COLUMNS, entry)
+    get_search_index().put("portfolio", title, title, f"Issue {issue_num}\n{description}")
 
-def save_script_file(title, content):
+def save_script_file(title, content, autosave=False):
     if not title: title = f"Script_{datetime.now().strftime('%Y%m%d_%H%M')}"
     safe_title = re.sub(r'[^a-zA-Z0-9]', '_', title)
     filename = f"{safe_title}.txt"
-    path = os.path.join(SCRIPT_DIR, filename)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(content)
+    # Autosaves skip the shields (so the same findings aren't logged every few
+    # seconds) and the version history: only explicit saves and restores make versions
+    if not autosave:
+        remember_safety_findings(f"script:{filename}", check_safety_batch(split_script_panels(content), source=filename))
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        get_script_history().record(filename, content)
+    get_search_index().put("script", filename, title, content)
+    if using_sqlite():
+        get_sqlite_store().save_script(filename, content)
+    else:
+        # Write-then-rename: a crash mid-save never leaves half a script behind
+        path = os.path.join(SCRIPT_DIR, filename)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+    cached_script_files.clear()
     return filename
 
+def delete_script_file(filename):
+    get_search_index().remove("script", filename)
+    if using_sqlite():
+        get_sqlite_store().delete_script(filename)
+    elif os.path.exists(os.path.join(SCRIPT_DIR, filename)):
+        os.remove(os.path.join(SCRIPT_DIR, filename))
+    cached_script_files.clear()
+
+# The archive listing is only re-read after a save or delete, not on every rerun
+@st.cache_data(show_spinner=False)
+def cached_script_files():
+    return list_script_files()
+
 def load_script_file(filename):
+    if using_sqlite(): return get_sqlite_store().load_script(filename)
     path = os.path.join(SCRIPT_DIR, filename)
     if os.path.exists(path):
         with open(path, "r", encoding="utf-8") as f:
             return f.read()
     return ""
 
-# --- UPDATED INITIALIZE ROSTER WITH MAPPING ---
+# --- SCRIPT SESSIONS ---
+# One per browser session: the selected script is read from disk once, edits
+# only flip `dirty`, and a small fragment autosaves after SCRIPT_AUTOSAVE_SECONDS
+# without edits (debounced), so typing never touches the disk.
+SCRIPT_AUTOSAVE_SECONDS = 5
+
+class ScriptSession:
+    def __init__(self):
+        self.selected = None
+        self.dirty = False
+        self.last_edit = 0.0
+        self.last_saved = None
+        self.history = None # version list of the selected script, read on first use
+
+    def select(self, filename):
+        if filename == self.selected: return
+        # Switching away from an edited script saves it first
+        if self.dirty and self.selected not in (None, "New Script"): self.save(self.selected.replace(".txt", ""), autosave=True)
+        self.selected = filename
+        self.dirty = False
+        self.history = None
+        if filename != "New Script": st.session_state['script_text'] = load_script_file(filename)
+
+    def touch(self):
+        self.dirty = True
+        self.last_edit = time.time()
+
+    def save(self, title, autosave=False):
+        filename = save_script_file(title, st.session_state.get('script_text', ""), autosave=autosave)
+        self.dirty = False
+        self.last_saved = time.time()
+        if not autosave: self.history = None
+        return filename
+
+    def versions(self):
+        # Cached so typing (one rerun per edit) never re-reads the manifest
+        if self.selected in (None, "New Script"): return []
+        if self.history is None: self.history = get_script_history().versions(self.selected)
+        return self.history
+
+    def autosave_due(self):
+        return self.dirty and self.selected not in (None, "New Script") and time.time() - self.last_edit >= SCRIPT_AUTOSAVE_SECONDS
+
+def get_script_session():
+    return st.session_state.setdefault("script_session", ScriptSession())
+
+@st.fragment(run_every=SCRIPT_AUTOSAVE_SECONDS)
+def script_autosave_status():
+    session = get_script_session()
+    if session.autosave_due(): session.save(session.selected.replace(".txt", ""), autosave=True)
+    if session.dirty: st.caption("✏️ Unsaved changes")
+    elif session.last_saved: st.caption(f"✅ Saved at {datetime.fromtimestamp(session.last_saved).strftime('%H:%M:%S')}")
+
+# --- SCRIPT PARSER ---
+# Scripts are parsed into pages -> panels -> description + dialogue. The text is
+# split on page headings first and a page is only parsed when its hash is new,
+# so typing on page 40 doesn't re-parse pages 1-39.
+PAGE_HEADING = re.compile(r"^[ \t]*\[?[ \t]*PAGE[ \t]*(\d+)[ \t]*\]?[ \t]*:?[ \t]*$", re.IGNORECASE | re.MULTILINE)
+PANEL_HEADING = re.compile(r"^\s*PANEL\s*(\d+)\s*[:.\-]?\s*(.*)$", re.IGNORECASE)
+DIALOGUE_LINE = re.compile(r"^\s*([A-Z0-9][A-Z0-9 .'\-]{0,30}?)\s*(?:\(([^)]*)\))?\s*:\s*(.+)$")
+SCRIPT_META = {"TITLE", "ISSUE"}
+NON_SPEAKERS = {"CAPTION", "SFX", "NOTE", "SETTING"}
+
+def split_script_pages(text):
+    # -> preamble (TITLE/ISSUE lines), [(page number, page text), ...]
+    headings = list(PAGE_HEADING.finditer(text))
+    if not headings: return text, []
+    pages = []
+    for i, m in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        pages.append((int(m.group(1)), text[m.end():end]))
+    return text[:headings[0].start()], pages
+
+def parse_page(chunk):
+    page = {"notes": [], "panels": []}
+    for line in chunk.splitlines():
+        if not line.strip(): continue
+        panel_match = PANEL_HEADING.match(line)
+        if panel_match:
+            page["panels"].append({"number": int(panel_match.group(1)), "description": [panel_match.group(2).strip()] if panel_match.group(2).strip() else [], "dialogue": []})
+            continue
+        target = page["panels"][-1] if page["panels"] else None
+        said = DIALOGUE_LINE.match(line)
+        if said and target is not None:
+            target["dialogue"].append({"speaker": said.group(1).strip(), "note": said.group(2) or "", "text": said.group(3).strip()})
+        elif target is not None:
+            target["description"].append(line.strip())
+        else:
+            page["notes"].append(line.strip())
+    return page
+
+class ScriptParser:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = {}    # script key -> {page hash: parsed page}
+        self.parsed = 0    # pages actually parsed...
+        self.reused = 0    # ...vs. served from the page cache
+
+    def parse(self, key, text):
+        preamble, chunks = split_script_pages(text or "")
+        meta = {}
+        for line in preamble.splitlines():
+            name, _, value = line.partition(":")
+            if name.strip().upper() in SCRIPT_META: meta[name.strip().lower()] = value.strip()
+        with self.lock:
+            old, new, pages = self.pages.get(key, {}), {}, []
+            for number, chunk in chunks:
+                h = hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+                page = new.get(h) or old.get(h)
+                if page is None:
+                    page = parse_page(chunk)
+                    self.parsed += 1
+                else:
+                    self.reused += 1
+                new[h] = page
+                pages.append({"number": number, "hash": h, **page})
+            self.pages[key] = new   # pages that vanished from the script are dropped
+        return {"title": meta.get("title", ""), "issue": meta.get("issue", ""), "pages": pages}
+
+@st.cache_resource
+def get_script_parser():
+    return ScriptParser()
+
+def get_hero_aliases():
+    # lower-case Hero Name / Real Name -> Hero Name, across every universe file
+    aliases = {}
+    for f in list_universe_files():
+        for row in load_data(f, ["Hero Name", "Real Name"]).to_dict("records"):
+            hero = row["Hero Name"].strip()
+            for alias in (hero, row["Real Name"].strip()):
+                if len(alias) >= 3: aliases.setdefault(alias.lower(), hero)
+    return aliases
+
+def script_breakdown(tree, aliases):
+    lines, words, panels = {}, 0, 0
+    refs = {}   # hero -> pages they speak or are mentioned on
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, sorted(aliases, key=len, reverse=True))) + r")\b", re.IGNORECASE) if aliases else None
+    for page in tree["pages"]:
+        panels += len(page["panels"])
+        text = [*page["notes"]]
+        for panel in page["panels"]:
+            text += panel["description"]
+            for d in panel["dialogue"]:
+                words += len(d["text"].split())
+                text.append(d["text"])
+                if d["speaker"].upper() in NON_SPEAKERS: continue
+                lines[d["speaker"].upper()] = lines.get(d["speaker"].upper(), 0) + 1
+                hero = aliases.get(d["speaker"].lower())
+                if hero: refs.setdefault(hero, set()).add(page["number"])
+        if pattern:
+            for m in pattern.findall("\n".join(text)): refs.setdefault(aliases[m.lower()], set()).add(page["number"])
+    cast = pd.DataFrame([{"Character": name, "Lines": count, "In Vault": "✅" if name.lower() in aliases else "❓"}
+                         for name, count in sorted(lines.items(), key=lambda item: -item[1])])
+    return {"pages": len(tree["pages"]), "panels": panels, "lines": sum(lines.values()), "words": words,
+            "cast": cast, "refs": {hero: sorted(p) for hero, p in sorted(refs.items())}}
+
+# --- SCRIPT VERSION HISTORY ---
+# Every save is recorded as a list of page hashes in a per-script manifest
+# (one JSON line per version). Pages are stored once, zlib-compressed, in a
+# content-addressed object folder, so an unchanged page costs nothing and the
+# archive grows with the edits, not with the number of saves.
+HISTORY_DIR = os.path.join(SCRIPT_DIR, ".history")
+HISTORY_OBJECTS = os.path.join(HISTORY_DIR, "objects")
+HISTORY_MAX_CHAIN = 20 # a delta sits on at most this many others before a full copy is stored
+
+def split_script_segments(text):
+    # Like split_script_pages, but keeps headings so the pieces join back exactly
+    starts = [m.start() for m in PAGE_HEADING.finditer(text)]
+    bounds = [0] + [s for s in starts if s > 0] + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:]) if b > a]
+
+# Segments (pages) are content-addressed, so unchanged pages are never stored
+# twice. A changed page is stored as a line delta (difflib opcodes) against the
+# same page of the previous version, unless a full copy would be smaller or the
+# delta chain is already HISTORY_MAX_CHAIN long.
+class ScriptHistory:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = None # {"objects", "bytes"}: counted once, then kept up to date by store
+
+    def object_path(self, digest, delta=False):
+        return os.path.join(HISTORY_OBJECTS, digest[:2], digest + (".delta" if delta else ""))
+
+    def store(self, path, packed):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(packed)
+        os.replace(path + ".tmp", path)
+        if self.totals is not None:
+            self.totals["objects"] += 1
+            self.totals["bytes"] += len(packed)
+
+    def write_object(self, data, base=None):
+        digest = hashlib.sha1(data.encode("utf-8")).hexdigest()
+        if os.path.exists(self.object_path(digest)) or os.path.exists(self.object_path(digest, delta=True)): return digest
+        packed = zlib.compress(data.encode("utf-8"), 9)
+        if base:
+            base_text, depth = self.load_object(base)
+            if depth < HISTORY_MAX_CHAIN:
+                old, new = base_text.splitlines(keepends=True), data.splitlines(keepends=True)
+                ops = [[i1, i2, "".join(new[j1:j2])] for tag, i1, i2, j1, j2
+                       in difflib.SequenceMatcher(a=old, b=new, autojunk=False).get_opcodes() if tag != "equal"]
+                delta = zlib.compress(json.dumps({"base": base, "depth": depth + 1, "ops": ops}).encode("utf-8"), 9)
+                if len(delta) < len(packed):
+                    self.store(self.object_path(digest, delta=True), delta)
+                    return digest
+        self.store(self.object_path(digest), packed)
+        return digest
+
+    def load_object(self, digest):
+        # -> (text, length of the delta chain under it)
+        try:
+            with open(self.object_path(digest), "rb") as f:
+                return zlib.decompress(f.read()).decode("utf-8"), 0
+        except FileNotFoundError:
+            pass
+        with open(self.object_path(digest, delta=True), "rb") as f:
+            delta = json.loads(zlib.decompress(f.read()))
+        lines, out, pos = self.load_object(delta["base"])[0].splitlines(keepends=True), [], 0
+        for i1, i2, text in delta["ops"]:
+            out += lines[pos:i1]
+            out.append(text)
+            pos = i2
+        return "".join(out + lines[pos:]), delta["depth"]
+
+    def read_object(self, digest):
+        return self.load_object(digest)[0]
+
+    def manifest_path(self, filename):
+        return os.path.join(HISTORY_DIR, filename + ".jsonl")
+
+    def versions(self, filename):
+        try:
+            with open(self.manifest_path(filename), "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def record(self, filename, content):
+        with self.lock:
+            history = self.versions(filename)
+            previous = history[-1]["pages"] if history else []
+            # Each page is diffed against the same page of the last version (or its last page)
+            pages = [self.write_object(seg, previous[min(i, len(previous) - 1)] if previous else None)
+                     for i, seg in enumerate(split_script_segments(content))]
+            if history and history[-1]["pages"] == pages: return history[-1]["version"]
+            entry = {"version": len(history) + 1, "saved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                     "pages": pages, "size": len(content)}
+            with open(self.manifest_path(filename), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            return entry["version"]
+
+    def pages(self, filename, version):
+        return next(v["pages"] for v in self.versions(filename) if v["version"] == version)
+
+    def load(self, filename, version):
+        return "".join(self.read_object(h) for h in self.pages(filename, version))
+
+    def diff(self, filename, old, new):
+        # Page-level match first: only pages whose hashes differ get a line diff
+        a, b = self.pages(filename, old), self.pages(filename, new)
+        out = []
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(a=a, b=b, autojunk=False).get_opcodes():
+            if tag == "equal": continue
+            before = "".join(self.read_object(h) for h in a[i1:i2]).splitlines()
+            after = "".join(self.read_object(h) for h in b[j1:j2]).splitlines()
+            out += difflib.unified_diff(before, after, f"v{old}", f"v{new}", lineterm="", n=2)
+        return "\n".join(out)
+
+    def stats(self):
+        with self.lock:
+            if self.totals is None:
+                files = glob.glob(os.path.join(HISTORY_OBJECTS, "*", "*"))
+                self.totals = {"objects": len(files), "bytes": sum(os.path.getsize(f) for f in files)}
+            return dict(self.totals)
+
+@st.cache_resource
+def get_script_history():
+    return ScriptHistory()
+
+# --- PAGE PREVIEW ---
+# Parsed pages are drawn by comic_pages.py on a shared process pool; panel tiles
+# and finished pages are cached in PAGE_CACHE_DIR, so a re-render only redraws
+# the panels that changed.
+PAGE_CACHE_DIR = "page_cache"
+PAGE_ART_WIDTH = 1024
+
+@st.cache_resource
+def get_page_pool():
+    return comic_pages.make_pool()
+
+def get_hero_art():
+    # lower-case Hero Name / Real Name -> character art (the cached 1024px
+    # thumbnail, so pool workers don't decode full-size PNGs for every panel)
+    art = {}
+    for f in list_universe_files():
+        for row in load_data(f, ["Hero Name", "Real Name", "Image_Path"]).to_dict("records"):
+            path = cloud_image_path(row["Image_Path"], IMAGE_DIR) if row["Image_Path"] else ""
+            if not os.path.isfile(path): continue
+            path = get_thumbnail(path, PAGE_ART_WIDTH)
+            for alias in (row["Hero Name"].strip(), row["Real Name"].strip()):
+                if len(alias) >= 3: art.setdefault(alias.lower(), path)
+    return art
+
+def render_script_pages(tree):
+    art = get_hero_art()
+    jobs = [{"page": page, "art": art, "cache_dir": PAGE_CACHE_DIR} for page in tree["pages"]]
+    return comic_pages.render_pages(jobs, get_page_pool())
+
+# --- ISSUE EXPORT ---
+# Exports are streamed to disk by comic_pages.export_issue and handed out
+# through Streamlit's static file serving, so the download never passes through
+# session memory. Only the newest EXPORT_KEEP files are kept (the static folder
+# is capped at 1 GB and static files at 200 MB each).
+EXPORT_DIR = os.path.join("static", "exports")
+EXPORT_URL = "app/static/exports"
+EXPORT_KEEP = 5
+EXPORT_STATIC_LIMIT = 200 * 1024 * 1024
+EXPORT_FORMATS = {"📦 CBZ (comic reader)": "cbz", "📄 PDF": "pdf"}
+
+def portfolio_issues():
+    issues = load_data(PORTFOLIO_FILE, PORTFOLIO_COLUMNS)["Issue"].astype(str).str.strip().str.lstrip("#")
+    return sorted(issue for issue in issues.unique() if issue)
+
+def portfolio_images(issue=None):
+    paths = []
+    for row in load_data(PORTFOLIO_FILE, PORTFOLIO_COLUMNS).to_dict("records"):
+        if issue is not None and str(row["Issue"]).strip().lstrip("#") != issue.lstrip("#"): continue
+        path = cloud_image_path(row["Image_Path"], PORTFOLIO_DIR) if row["Image_Path"] else ""
+        if os.path.isfile(path): paths.append(path)
+    return paths
+
+def export_issue(title, paths, fmt):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    safe_title = re.sub(r'[^a-zA-Z0-9]', '_', title) or "Issue"
+    out_path = os.path.join(EXPORT_DIR, f"{safe_title}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}")
+    count = comic_pages.export_issue(paths, out_path, fmt, title=title, pool=get_page_pool())
+    old = sorted((e for e in os.scandir(EXPORT_DIR) if not e.name.endswith(".tmp")), key=lambda e: e.stat().st_mtime)
+    for entry in old[:-EXPORT_KEEP]: os.remove(entry.path)
+    return out_path, count
+
+def show_export_link(path, count):
+    size_mb = os.path.getsize(path) / 1024 / 1024
+    name = os.path.basename(path)
+    if st.get_option("server.enableStaticServing") and os.path.getsize(path) <= EXPORT_STATIC_LIMIT:
+        st.markdown(f'<a href="{EXPORT_URL}/{name}" download="{name}">⬇️ Download {name}</a> ({count} page(s), {size_mb:.1f} MB)', unsafe_allow_html=True)
+    else:
+        # Static serving off -> st.download_button has to load the file into memory
+        with open(path, "rb") as f:
+            st.download_button(f"⬇️ Download {name} ({count} page(s), {size_mb:.1f} MB)", f.read(), file_name=name)
+
+# --- ROSTER SCHEMA MAP ---
+# New column -> old column names to try, in order (first non-blank value wins).
+# Covers roster_completed.csv, roster_examples.csv and the older characters.csv.
+ROSTER_SCHEMA = {
+    "Hero Name": ["Hero Name", "Alias"],
+    "Real Name": ["Real Name", "Name"],
+    "Role": ["Role / Archetype", "Role"],
+    "Universe": ["Universe"],
+    "Super Power": ["Super Powers", "Super Power", "Power"],
+    "Weakness": ["Weaknesses", "Weakness"],
+    "Costume": ["Costume / Visuals", "Costume"],
+    "Signature Move": ["Signature Move"],
+    "Magic": ["Magic"],
+    "Strength": ["Strength"],
+    "Origin": ["Origin"],
+    "Personality": ["Personality"],
+    "Catchphrase": ["Catchphrase"],
+    "Enemies": ["Enemies"],
+    "Allies": ["Allies"],
+    "Speaking Style": ["Speaking Style"],
+    "Relationships": ["Relationships"],
+    "Image_Path": ["Picture Link", "Uploaded Sketch", "Uploaded Photo", "Image_Path"],
+}
+ROSTER_DEFAULTS = {"Universe": "Home"}
+
+def map_roster_columns(df):
+    df = df.rename(columns=lambda c: str(c).strip()) # Remove spaces like 'Strength '
+    # Blank cells -> NaN, so coalescing the sources picks the first real value
+    text = df.astype(str)
+    filled = text.where(text.apply(lambda col: col.str.strip() != ""))
+    mapped = pd.DataFrame(index=df.index)
+    for target, sources in ROSTER_SCHEMA.items():
+        mapped[target] = None
+        for source in reversed([c for c in sources if c in filled.columns]):
+            mapped[target] = filled[source].fillna(mapped[target])
+    mapped = mapped.fillna(ROSTER_DEFAULTS).fillna("").astype(str)
+    mapped["Image_Path"] = mapped["Image_Path"].str.strip().str.replace("\\", "/", regex=False)
+    return mapped[mapped["Hero Name"].str.strip() != ""].reset_index(drop=True)
+
+def load_roster_file(file_path):
+    return map_roster_columns(pd.read_csv(file_path, dtype=str, keep_default_na=False))
+
 def initialize_roster():
     target_file = None
     for f in ROSTER_FILES:
         if os.path.exists(f): target_file = f; break     
     if target_file:
         try:
-            ex_df = pd.read_csv(target_file)
-            ex_df.columns = ex_df.columns.str.strip() # Remove spaces like 'Strength '
-            
-            if 'Hero Name' not in ex_df.columns: return False
-            ex_df = ex_df.dropna(subset=['Hero Name'])
-            
-            for f in glob.glob("universe_*.csv"): os.remove(f)
-            
-            for index, row in ex_df.iterrows():
-                # --- MAPPING OLD COLUMNS TO NEW ---
-                data = {}
-                data['Hero Name'] = str(row.get('Hero Name', ''))
-                data['Real Name'] = str(row.get('Real Name', ''))
-                
-                # Map 'Role / Archetype' to 'Role'
-                data['Role'] = str(row.get('Role / Archetype', row.get('Role', '')))
-                
-                # Map 'Super Powers' to 'Super Power'
-                data['Super Power'] = str(row.get('Super Powers', row.get('Super Power', '')))
-                
-                # Map 'Weaknesses' to 'Weakness'
-                data['Weakness'] = str(row.get('Weaknesses', row.get('Weakness', '')))
-                
-                # Map 'Costume / Visuals' to 'Costume'
-                data['Costume'] = str(row.get('Costume / Visuals', row.get('Costume', '')))
-                
-                data['Signature Move'] = str(row.get('Signature Move', ''))
-                data['Magic'] = str(row.get('Magic', ''))
-                data['Strength'] = str(row.get('Strength', '')) # Strip already handled
-                data['Origin'] = str(row.get('Origin', ''))
-                data['Personality'] = str(row.get('Personality', ''))
-                data['Catchphrase'] = str(row.get('Catchphrase', ''))
-                data['Enemies'] = str(row.get('Enemies', ''))
-                data['Allies'] = str(row.get('Allies', ''))
-                data['Speaking Style'] = str(row.get('Speaking Style', ''))
-                data['Relationships'] = str(row.get('Relationships', ''))
-                data['Universe'] = str(row.get('Universe', 'Home'))
-                if not data['Universe']: data['Universe'] = "Home"
-
-                # Image Logic
-                img_filename = row.get('Picture Link', '')
-                if not img_filename or str(img_filename).lower() == 'nan':
-                    # Try alternate column
-                    img_filename = row.get('Uploaded Sketch', row.get('Uploaded Photo', ''))
-                
-                final_img_path = ""
-                if img_filename and str(img_filename).lower() != 'nan':
-                    img_filename = str(img_filename).strip()
-                    target_path = os.path.join(IMAGE_DIR, os.path.basename(img_filename))
-                    if os.path.exists(img_filename): 
-                        shutil.copy(img_filename, target_path)
-                        final_img_path = target_path
-                    elif os.path.exists(target_path): 
-                        final_img_path = target_path
-                data['Image_Path'] = final_img_path
-                
-                save_character(data)
-            return True 
+            mapped = load_roster_file(target_file)
+            remember_safety_findings("roster", check_safety_batch(mapped, source=target_file))
+            return sync_roster(mapped)
         except Exception as e: 
             print(f"Error initializing: {e}")
             return False
     return False
 
+# --- INCREMENTAL ROSTER SYNC ---
+# Each source row is hashed (including its picture's mtime/size) and compared
+# with the manifest from the last sync. Only new/changed/removed heroes are
+# written, with ONE write per universe file, and only their images are copied.
+ROSTER_MANIFEST = "roster_manifest.json"
+
+def import_roster_image(img_filename):
+    if not img_filename: return ""
+    target_path = os.path.join(IMAGE_DIR, os.path.basename(img_filename))
+    if os.path.isfile(img_filename):
+        if os.path.abspath(img_filename) != os.path.abspath(target_path) and (
+                not os.path.exists(target_path) or os.path.getmtime(img_filename) > os.path.getmtime(target_path)):
+            shutil.copy2(img_filename, target_path)
+        return target_path
+    return target_path if os.path.exists(target_path) else ""
+
+def image_signature(img_filename):
+    for path in (img_filename, os.path.join(IMAGE_DIR, os.path.basename(img_filename))):
+        if img_filename and os.path.isfile(path):
+            stat = os.stat(path)
+            return f"{stat.st_mtime_ns}:{stat.st_size}"
+    return ""
+
+def sync_roster(mapped):
+    try:
+        with open(ROSTER_MANIFEST, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    mapped = mapped.drop_duplicates(subset=["Universe", "Hero Name"], keep="last").reset_index(drop=True)
+    files = mapped["Universe"].map(get_universe_filename)
+    keys = files + "|" + mapped["Hero Name"]
+    signed = mapped.assign(_img=mapped["Image_Path"].map(image_signature))
+    hashes = pd.util.hash_pandas_object(signed, index=False).astype(str)
+
+    # Heroes deleted from a universe file by hand count as changed (-> restored)
+    present = set()
+    for f in files.unique():
+        present.update(f + "|" + load_data(f, ["Hero Name"])["Hero Name"])
+    changed = (keys.map(manifest.get) != hashes) | ~keys.isin(present)
+    removed = [k for k in manifest if k not in set(keys)]
+
+    updates = mapped[changed].copy()
+    updates["Image_Path"] = updates["Image_Path"].map(import_roster_image)
+    # One groupby splits the changes per universe file -> one write per file
+    batches = dict(list(updates.groupby(files[changed])))
+    gone = {}
+    for k in removed: gone.setdefault(k.split("|", 1)[0], set()).add(k.split("|", 1)[1])
+    touched = set(batches) | set(gone)
+    for universe_file in touched:
+        write_universe_batch(universe_file, batches.get(universe_file, updates.iloc[:0]), gone.get(universe_file, set()))
+
+    with open(ROSTER_MANIFEST + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(dict(zip(keys, hashes)), f)
+    os.replace(ROSTER_MANIFEST + ".tmp", ROSTER_MANIFEST)
+    return {"changed": int(changed.sum()), "removed": len(removed), "files": len(touched)}
+
+def write_universe_batch(universe_file, rows, removed_names):
+    # Upsert `rows` + drop `removed_names` in a single write of the universe file
+    index = get_search_index()
+    for _, row in rows.iterrows(): index.put("character", *character_document(universe_file, row))
+    for name in removed_names: index.remove("character", f"{universe_file}|{name}")
+    if using_sqlite(): return get_sqlite_store().write_universe_batch(universe_file, rows, removed_names)
+    current = load_data(universe_file, FULL_CHAR_COLUMNS)
+    position = {name: i for i, name in enumerate(current["Hero Name"])}
+    merged = pd.concat([current, rows[FULL_CHAR_COLUMNS]], ignore_index=True)
+    merged = merged.drop_duplicates(subset="Hero Name", keep="last")
+    merged = merged[~merged["Hero Name"].isin(removed_names)]
+    # Updated heroes keep their old spot in the file, new ones go at the end
+    merged = merged.assign(_pos=[position.get(n, len(position) + i) for i, n in enumerate(merged["Hero Name"])])
+    merged.sort_values("_pos").drop(columns="_pos").to_csv(universe_file + ".tmp", index=False)
+    os.replace(universe_file + ".tmp", universe_file)
+
+# --- SEARCH INDEX ---
+# SQLite FTS5 inverted index over heroes, timeline events, scripts and the
+# portfolio. It is built once, then every save/delete helper updates just the
+# document it touched, so a search is one ranked (bm25) index lookup.
+SEARCH_DB = "search_index.db"
+SEARCH_KINDS = {"character": "🦸", "timeline": "⏳", "script": "📝", "portfolio": "📚"}
+SEARCH_LIMIT = 25
+
+class SearchIndex:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self.connect() as con:
+            con.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(
+                               kind UNINDEXED, doc_id UNINDEXED, title, body, tokenize = 'porter unicode61')""")
+            # kind/doc_id are UNINDEXED in FTS -> deleting by them scans the whole
+            # table. doc_map is a plain B-tree lookup to the FTS rowid instead.
+            con.execute("""CREATE TABLE IF NOT EXISTS doc_map (
+                               kind TEXT, doc_id TEXT, fts_rowid INTEGER, PRIMARY KEY (kind, doc_id))""")
+            if con.execute("SELECT COUNT(*) FROM doc_map").fetchone()[0] == 0: # index built before doc_map existed
+                con.execute("INSERT OR REPLACE INTO doc_map SELECT kind, doc_id, rowid FROM docs")
+
+    def connect(self):
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            self.local.con = con
+        return con
+
+    def drop(self, con, kind, doc_id):
+        row = con.execute("SELECT fts_rowid FROM doc_map WHERE kind = ? AND doc_id = ?", (kind, doc_id)).fetchone()
+        if row: con.execute("DELETE FROM docs WHERE rowid = ?", row)
+
+    def put(self, kind, doc_id, title, body):
+        with self.connect() as con:
+            self.drop(con, kind, doc_id)
+            rowid = con.execute("INSERT INTO docs (kind, doc_id, title, body) VALUES (?, ?, ?, ?)", (kind, doc_id, title, body)).lastrowid
+            con.execute("INSERT OR REPLACE INTO doc_map VALUES (?, ?, ?)", (kind, doc_id, rowid))
+
+    def remove(self, kind, doc_id):
+        with self.connect() as con:
+            self.drop(con, kind, doc_id)
+            con.execute("DELETE FROM doc_map WHERE kind = ? AND doc_id = ?", (kind, doc_id))
+
+    def count(self):
+        return self.connect().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def documents(self):
+        # Everything the studio has, as (kind, doc_id, title, body)
+        for universe_file in list_universe_files():
+            for _, row in load_data(universe_file, FULL_CHAR_COLUMNS).iterrows():
+                yield ("character", *character_document(universe_file, row))
+        for _, row in load_data(TIMELINE_FILE, TIMELINE_COLUMNS).iterrows():
+            yield ("timeline", *timeline_document(row["Year"], row["Event"]))
+        for _, row in load_data(PORTFOLIO_FILE, PORTFOLIO_COLUMNS).iterrows():
+            yield ("portfolio", row["Title"], row["Title"], f"Issue {row['Issue']}\n{row['Description']}")
+        for filename in list_script_files():
+            yield ("script", filename, filename.replace(".txt", ""), load_script_file(filename))
+
+    def rebuild(self):
+        # One bulk insert; a repeated (kind, doc_id) keeps its last version, as put() would
+        docs = {(d[0], d[1]): d for d in self.documents()}
+        con = self.connect()
+        with con:
+            con.execute("DELETE FROM docs")
+            con.execute("DELETE FROM doc_map")
+            con.executemany("INSERT INTO docs (kind, doc_id, title, body) VALUES (?, ?, ?, ?)", docs.values())
+            con.execute("INSERT INTO doc_map SELECT kind, doc_id, rowid FROM docs")
+        return self.count()
+
+    def search(self, query, kinds=None, limit=SEARCH_LIMIT):
+        # Every word is matched as a prefix ("fara" finds "Faraday"); title hits weigh more
+        terms = re.findall(r"\w+", query)
+        if not terms: return []
+        sql = """SELECT kind, doc_id, title, snippet(docs, 3, '**', '**', ' … ', 12), bm25(docs, 0, 0, 5.0, 1.0) AS rank
+                 FROM docs WHERE docs MATCH ?"""
+        params = [" ".join(f'"{t}"*' for t in terms)]
+        if kinds:
+            sql += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params += list(kinds)
+        sql += " ORDER BY rank LIMIT ?"
+        return self.connect().execute(sql, params + [limit]).fetchall()
+
+@st.cache_resource
+def get_search_index():
+    index = SearchIndex(SEARCH_DB)
+    if index.count() == 0: index.rebuild()
+    return index
+
+def character_document(universe_file, data):
+    body = "\n".join(f"{col}: {data.get(col)}" for col in FULL_CHAR_COLUMNS if col != "Image_Path" and data.get(col))
+    return f"{universe_file}|{data.get('Hero Name')}", str(data.get("Hero Name")), body
+
+def timeline_document(year, event):
+    return f"{year}|{hashlib.sha1(str(event).encode('utf-8')).hexdigest()[:12]}", str(year), str(event)
+
+def index_character(universe_file, data):
+    if universe_file.endswith(".csv"): get_search_index().put("character", *character_document(universe_file, data))
+
+# --- RELATIONSHIP GRAPH ---
+# The free-text Relationships / Allies / Enemies columns are parsed into one
+# adjacency map ("Sketch (Nephew)" -> edge CIPHER - SKETCH, label "Nephew").
+# It is rebuilt only when a universe file (or the database) changes.
+RELATION_COLUMNS = {"Relationships": "family", "Allies": "ally", "Enemies": "enemy"}
+RELATION_ENTRY = re.compile(r"([^,;()]+?)\s*(?:\(([^()]*)[()]?|(?=[,;]|$))")
+RELATION_SKIP = {"unknown", "none", "n/a", "na", "-"}
+RELATION_COLORS = {"enemy": "red", "ally": "blue", "family": "darkgreen"}
+RELATION_WORDS = {"enemy": "enemies", "ally": "allies", "family": "family"}
+PAIRING_STRATEGIES = ["🎲 Random", "⚔️ Rivals", "🤝 Allies", "👋 Never Met"]
+
+def roster_signature():
+    files = [DB_FILE, DB_FILE + "-wal"] if using_sqlite() else list_universe_files()
+    sig = []
+    for f in files:
+        try:
+            stat = os.stat(f)
+            sig.append((f, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            pass
+    return tuple(sig)
+
+class RelationshipGraph:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.signature = None
+        self.heroes = {}   # lower-case hero name -> name as written in the vault
+        self.adj = {}      # node -> {other node: {"kinds": set, "labels": set}}
+
+    def refresh(self):
+        sig = roster_signature()
+        with self.lock:
+            if sig == self.signature: return self
+            frames = [load_data(f, ["Hero Name"] + list(RELATION_COLUMNS)) for f in list_universe_files()]
+            heroes = {n.strip().lower(): n.strip() for df in frames for n in df["Hero Name"] if n.strip()}
+            adj = {}
+            for df in frames:
+                for row in df.to_dict("records"):
+                    hero = row["Hero Name"].strip()
+                    if not hero: continue
+                    adj.setdefault(hero, {})
+                    for col, kind in RELATION_COLUMNS.items():
+                        for name, label in RELATION_ENTRY.findall(row[col]):
+                            name = name.strip(" .")
+                            if not name or name.lower() in RELATION_SKIP: continue
+                            # Non-vault names ("Dr. Evil", "the DMV") become outside nodes, spelled as first seen
+                            other = heroes.get(name.lower()) or heroes.setdefault(f"~{name.lower()}", name)
+                            if other == hero: continue
+                            for a, b in [(hero, other), (other, hero)]:
+                                edge = adj.setdefault(a, {}).setdefault(b, {"kinds": set(), "labels": set()})
+                                edge["kinds"].add(kind)
+                            if label.strip(): adj[hero][other]["labels"].add(label.strip())
+            self.heroes = {k: v for k, v in heroes.items() if not k.startswith("~")}
+            self.adj, self.signature = adj, sig
+        return self
+
+    def is_hero(self, node):
+        return node.lower() in self.heroes
+
+    def neighbors(self, name, kinds=None):
+        return {other: edge for other, edge in self.adj.get(name, {}).items() if not kinds or edge["kinds"] & set(kinds)}
+
+    def neighborhood(self, name, depth=1):
+        seen, frontier = {name}, {name}
+        for _ in range(depth):
+            frontier = {o for n in frontier for o in self.adj.get(n, {})} - seen
+            seen |= frontier
+        return seen
+
+    def pick_pair(self, strategy):
+        heroes = sorted(self.heroes.values())
+        if len(heroes) < 2: return None
+        if strategy == "⚔️ Rivals": kinds = {"enemy"}
+        elif strategy == "🤝 Allies": kinds = {"ally", "family"}
+        elif strategy == "👋 Never Met":
+            pairs = [(a, b) for a in heroes for b in heroes if a < b and b not in self.adj.get(a, {})]
+            return random.choice(pairs) if pairs else None
+        else:
+            return tuple(random.sample(heroes, 2))
+        pairs = [(a, b) for a in heroes for b, edge in self.neighbors(a, kinds).items() if a < b and self.is_hero(b)]
+        return random.choice(pairs) if pairs else None
+
+    def describe(self, a, b):
+        edge = self.adj.get(a, {}).get(b)
+        if not edge: return f"{a} and {b} have never met."
+        labels = f" ({', '.join(sorted(edge['labels']))})" if edge["labels"] else ""
+        return f"{a} and {b} are {' and '.join(RELATION_WORDS[k] for k in sorted(edge['kinds']))}{labels}."
+
+    def to_dot(self, focus=None, depth=1):
+        nodes = self.neighborhood(focus, depth) if focus else set(self.adj)
+        quote = lambda n: '"' + n.replace('"', '\\"') + '"'
+        lines = ["graph G {", '  graph [bgcolor="transparent", overlap=false]; node [style=filled, fontname="Helvetica"];']
+        for n in sorted(nodes):
+            fill = "gold" if n == focus else ("yellow" if self.is_hero(n) else "lightgray")
+            lines.append(f"  {quote(n)} [fillcolor={fill}, shape={'box' if self.is_hero(n) else 'ellipse'}];")
+        for a in sorted(nodes):
+            for b, edge in sorted(self.adj.get(a, {}).items()):
+                if b not in nodes or b < a: continue
+                kind = next(k for k in ["enemy", "ally", "family"] if k in edge["kinds"])
+                labels = ", ".join(sorted(edge["labels"] | self.adj[b][a]["labels"]))
+                lines.append(f"  {quote(a)} -- {quote(b)} [color={RELATION_COLORS[kind]}, label={quote(labels)}, fontsize=9];")
+        lines.append("}")
+        return "\n".join(lines)
+
+@st.cache_resource
+def get_relationship_graph():
+    return RelationshipGraph()
+
 # --- AI LOGIC ---
-def generate_ai_content(prompt):
-    models_to_try = [
-        "gemini-2.0-flash", "gemini-2.0-flash-exp", 
-        "gemini-2.5-flash", "gemini-1.5-pro-latest"
-    ]
+AI_MODELS = [
+    "gemini-2.0-flash", "gemini-2.0-flash-exp", 
+    "gemini-2.5-flash", "gemini-1.5-pro-latest"
+]
+AI_HEDGE_DELAY = 4.0       # seconds without a FIRST chunk before the next model also starts
+AI_BREAKER_FAILURES = 2    # failures in a row before a model is skipped...
+AI_BREAKER_COOLDOWN = 300  # ...for this many seconds
+AI_CACHE_FILE = "ai_cache.db"
+AI_CACHE_TTL = 7 * 24 * 3600 # cached answers expire after a week...
+AI_CACHE_MAX_ENTRIES = 1000  # ...or when they're the least recently used past this many
+# COMIC_STUDIO_AI_STUB=1 swaps Gemini for a local stub model (offline checks, no API key)
+AI_STUB = os.environ.get("COMIC_STUDIO_AI_STUB") == "1"
+
+# Circuit breaker shared by all sessions: models that keep failing are skipped
+# until their cooldown runs out, so nobody waits on a model we know is down.
+class ModelHealth:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = {}
+        self.open_until = {}
+
+    def available(self, models):
+        now = time.time()
+        with self.lock:
+            healthy = [m for m in models if self.open_until.get(m, 0) <= now]
+        return healthy or list(models) # Everything tripped -> try them all anyway
+
+    def record(self, model_name, success):
+        with self.lock:
+            if success:
+                self.failures[model_name] = 0
+                self.open_until.pop(model_name, None)
+                return
+            self.failures[model_name] = self.failures.get(model_name, 0) + 1
+            if self.failures[model_name] >= AI_BREAKER_FAILURES:
+                self.open_until[model_name] = time.time() + AI_BREAKER_COOLDOWN
+
+@st.cache_resource
+def get_model_health():
+    return ModelHealth()
+
+@st.cache_resource
+def get_ai_pool():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai")
+
+# --- AI RESPONSE CACHE ---
+# Answers are stored on disk, keyed on the normalized prompt + model list +
+# generation settings, so the same question isn't paid for twice.
+class ResponseCache:
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.con = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.con:
+            self.con.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL, last_used REAL)")
+            self.con.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, prompt, settings):
+        normalized = " ".join(prompt.split()).lower()
+        payload = json.dumps({"prompt": normalized, "models": AI_MODELS, "settings": settings}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self.con:
+            row = self.con.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= AI_CACHE_TTL:
+                self.con.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+            if row: self.con.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+
+    def put(self, key, model_name, response):
+        now = time.time()
+        with self.lock, self.con:
+            self.con.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, model_name, response, now, now))
+            self.con.execute("""DELETE FROM responses WHERE key IN (SELECT key FROM responses
+                                ORDER BY last_used DESC LIMIT -1 OFFSET ?)""", (AI_CACHE_MAX_ENTRIES,))
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            entries = self.con.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(AI_CACHE_FILE)
+
+class StubModel:
+    # Offline stand-in for genai.GenerativeModel: same answer for the same prompt
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+        text = f"NO. (Stub answer {digest} from {self.model_name}.)"
+        if stream: return [types.SimpleNamespace(text=word) for word in re.findall(r"\S+\s*", text)]
+        return types.SimpleNamespace(text=text)
+
+def call_model_stream(model_name, prompt, settings):
+    model = StubModel(model_name) if AI_STUB else genai.GenerativeModel(model_name)
+    config = {k: v for k, v in settings.items() if v is not None}
+    response = model.generate_content(prompt, generation_config=config or None, stream=True)
+    try:
+        for chunk in response:
+            if chunk.text: yield chunk.text
+    except GeneratorExit:
+        # Closed early (a cancelled hedge) -> hang up the HTTP/gRPC stream so the
+        # model stops generating instead of finishing an answer nobody reads
+        stream = getattr(response, "_iterator", None)
+        stop = getattr(stream, "cancel", None) or getattr(stream, "close", None)
+        if stop: stop()
+        raise
+
+def generate_ai_content(prompt, use_cache=True, temperature=None, hedge_delay=AI_HEDGE_DELAY, stream=False):
     safety_prompt_add = ""
     if "villain" in prompt.lower() or "bad guy" in prompt.lower():
         safety_prompt_add = "\n(INSTRUCTION: Focus on backstory/motivation.)"
     full_prompt = prompt + safety_prompt_add
-    
-    last_error = ""
-    for model_name in models_to_try:
+
+    # use_cache=False ("give me something new") skips the lookup but still
+    # stores the fresh answer for next time.
+    settings = {"temperature": temperature}
+    cache = get_response_cache()
+    cache_key = cache.make_key(full_prompt, settings)
+    if stream: return stream_ai_content(full_prompt, settings, cache_key, use_cache, hedge_delay)
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None: return cached
+
+    try:
+        model_name, answer = race_models(full_prompt, settings, hedge_delay)
+    except RuntimeError as e:
+        return f"⚠️ **CONNECTION FAILED.** Error Code: {e}"
+    cache.put(cache_key, model_name, answer)
+    return answer
+
+def stream_ai_content(full_prompt, settings, cache_key, use_cache, hedge_delay):
+    # Generator version of generate_ai_content (stream=True): yields text as it
+    # arrives from the healthiest model. If the stream fails (before or part-way
+    # through) we fall back once to the blocking, hedged path and yield the rest.
+    cache = get_response_cache()
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    health = get_model_health()
+    model_name = health.available(AI_MODELS)[0]
+    chunks = []
+    try:
+        for chunk in call_model_stream(model_name, full_prompt, settings):
+            chunks.append(chunk)
+            yield chunk
+    except Exception:
+        health.record(model_name, False)
+    else:
+        health.record(model_name, True)
+        if chunks:
+            cache.put(cache_key, model_name, "".join(chunks))
+            return
+
+    sent = "".join(chunks)
+    try:
+        model_name, answer = race_models(full_prompt, settings, hedge_delay)
+    except RuntimeError as e:
+        yield f"\n\n⚠️ **TRANSMISSION CUT OFF.** Error Code: {e}" if sent else f"⚠️ **CONNECTION FAILED.** Error Code: {e}"
+        return
+    cache.put(cache_key, model_name, answer)
+    # Same model, same prompt -> the answer usually repeats what already arrived
+    if answer.startswith(sent): yield answer[len(sent):]
+    else: yield f"\n\n⚠️ **TRANSMISSION CUT OFF, RETRANSMITTING...**\n\n{answer}"
+
+def run_attempt(model_name, prompt, settings, cancel, events, health):
+    # One hedged attempt, streamed so it can report its first chunk and be
+    # stopped part-way. Posts ("first" | "done" | "failed" | "cancelled", model, payload).
+    chunks = []
+    stream = call_model_stream(model_name, prompt, settings)
+    try:
+        for chunk in stream:
+            if cancel.is_set(): break
+            if not chunks: events.put(("first", model_name, None))
+            chunks.append(chunk)
+        if not cancel.is_set() and not chunks: raise RuntimeError(f"{model_name} returned an empty answer")
+    except Exception as e:
+        health.record(model_name, False)
+        events.put(("failed", model_name, e))
+        return
+    finally:
+        stream.close()
+    if cancel.is_set():
+        events.put(("cancelled", model_name, None))
+        return
+    health.record(model_name, True)
+    events.put(("done", model_name, "".join(chunks)))
+
+def race_models(full_prompt, settings, hedge_delay):
+    # Hedged requests on time-to-first-chunk: start the preferred model; only if
+    # no attempt has produced any text within `hedge_delay` (or it failed) does
+    # the next fallback start alongside it. The first attempt to produce text
+    # leads, and every other attempt is cancelled: its stream is closed at the
+    # next chunk, so a slow loser stops generating rather than running to the end.
+    health = get_model_health()
+    waiting = health.available(AI_MODELS)
+    events = queue.Queue()
+    running = {} # model -> cancel flag
+    leader, last_error, start_next = None, "", True
+    while True:
+        if start_next and waiting and leader is None:
+            model_name = waiting.pop(0)
+            running[model_name] = threading.Event()
+            get_ai_pool().submit(run_attempt, model_name, full_prompt, settings, running[model_name], events, health)
+        if not running: raise RuntimeError(last_error)
         try:
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(full_prompt)
-            return response.text
-        except Exception as e:
-            last_error = str(e)
-            time.sleep(1)
-            continue 
-    return f"⚠️ **CONNECTION FAILED.** Error Code: {last_error}"
+            kind, model_name, payload = events.get(timeout=hedge_delay if waiting and leader is None else None)
+        except queue.Empty:
+            start_next = True # Nobody has said a word yet -> hedge
+            continue
+        start_next = False
+        if kind == "first" and leader is None:
+            leader = model_name
+            for other, cancel in running.items():
+                if other != leader: cancel.set()
+        elif kind == "done":
+            for cancel in running.values(): cancel.set()
+            return model_name, payload
+        elif kind in ("failed", "cancelled"):
+            running.pop(model_name, None)
+            if kind == "failed":
+                last_error = str(payload)
+                if model_name == leader: leader = None
+                start_next = True # Fall back straight away
+
+# --- TIMELINE CONTEXT FOR THE LOGIC COP ---
+# Instead of pasting the whole history into every prompt, the Logic Cop gets a
+# rolling summary + only the events that matter for the new one (same
+# characters, or within a few years). The prompt stays the same size forever.
+TIMELINE_SUMMARY_FILE = "timeline_summary.json"
+TIMELINE_YEAR_WINDOW = 5         # events this many years either side count as relevant
+TIMELINE_MAX_RELEVANT = 12       # most events quoted word-for-word in a prompt
+TIMELINE_SUMMARY_BATCH = 20      # new events folded into the summary per AI call
+TIMELINE_SUMMARY_MAX_WORDS = 250
+# Words that mark the year a character enters the story (used by the local pre-check)
+# Only clear markers: "arrives in Paris" or "learns the origin of..." are not an introduction
+INTRO_PATTERN = re.compile(r"\b(born|created|introduced|first appear\w*|debut\w*)\b", re.IGNORECASE)
+
+def get_roster_names():
+    names = set()
+    for f in list_universe_files():
+        df = load_data(f, ["Hero Name", "Real Name"])
+        names.update(n.strip() for n in pd.concat([df["Hero Name"], df["Real Name"]]) if len(n.strip()) >= 3)
+    return sorted(names, key=str.lower)
+
+def normalize_event(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text).lower()).split())
+
+def to_year(value):
+    try:
+        return int(float(str(value).strip()))
+    except (ValueError, OverflowError):
+        return None
 
-def check_timeline_logic(new_event, existing_df):
+class TimelineContext:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = {}       # row hash -> {"year", "text", "names"}
+        self.by_name = {}      # lower-case name -> row hashes that mention it
+        self.by_year = []      # sorted (year, row hash) pairs, for year-window lookups
+        self.order = []        # row hashes in timeline order
+        self.texts = {}        # normalized event text -> year label (duplicate check)
+        self.introduced = {}   # lower-case name -> earliest year of an intro event
+        self.names_pattern = None
+        self.names_key = None
+        try:
+            with open(TIMELINE_SUMMARY_FILE, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        self.summary = saved.get("summary", "")
+        self.summarized = set(saved.get("summarized", []))
+
+    def find_names(self, text):
+        if not self.names_pattern: return set()
+        return {m.lower() for m in self.names_pattern.findall(text)}
+
+    def refresh(self, df, names):
+        # Incremental: only rows we haven't seen are indexed, vanished rows dropped
+        with self.lock:
+            if names != self.names_key:
+                self.names_key = names
+                self.names_pattern = re.compile(r"\b(" + "|".join(map(re.escape, names)) + r")\b", re.IGNORECASE) if names else None
+                self.events, self.by_name = {}, {}
+                self.order = [] # names feed `introduced` -> rebuild the derived indexes too
+            hashes = pd.util.hash_pandas_object(df[["Year", "Event"]], index=False).astype(str).tolist()
+            for h, year, text in zip(hashes, df["Year"], df["Event"]):
+                if h in self.events: continue
+                entry = {"year": to_year(year), "label": str(year), "text": str(text), "names": self.find_names(str(text))}
+                self.events[h] = entry
+                for name in entry["names"]: self.by_name.setdefault(name, set()).add(h)
+            for h in set(self.events) - set(hashes):
+                for name in self.events.pop(h)["names"]: self.by_name.get(name, set()).discard(h)
+            if hashes != self.order:
+                self.by_year = sorted((e["year"], h) for h, e in self.events.items() if e["year"] is not None)
+                self.texts = {normalize_event(e["text"]): e["label"] for e in self.events.values()}
+                self.introduced = {}
+                for e in self.events.values():
+                    if e["year"] is None or not INTRO_PATTERN.search(e["text"]): continue
+                    for name in e["names"]: self.introduced[name] = min(e["year"], self.introduced.get(name, e["year"]))
+            self.order = hashes
+
+    def relevant(self, year, text, limit=TIMELINE_MAX_RELEVANT):
+        with self.lock:
+            names = self.find_names(text)
+            scores = {}
+            for name in names:
+                for h in self.by_name.get(name, ()): scores[h] = scores.get(h, 0) + 2
+            if year is not None:
+                lo = bisect.bisect_left(self.by_year, (year - TIMELINE_YEAR_WINDOW, ""))
+                hi = bisect.bisect_right(self.by_year, (year + TIMELINE_YEAR_WINDOW, "\uffff"))
+                for _, h in self.by_year[lo:hi]: scores[h] = scores.get(h, 0) + 1
+            # Not summarized yet -> the model has never seen it, so it ranks a bit higher
+            for h in self.order[-TIMELINE_SUMMARY_BATCH:]:
+                if h not in self.summarized: scores[h] = scores.get(h, 0) + 0.5
+            position = {h: i for i, h in enumerate(self.order)}
+            best = sorted(scores, key=lambda h: (-scores[h], -position.get(h, 0)))[:limit]
+            return [self.events[h] for h in sorted(best, key=lambda h: position.get(h, 0))]
+
+    def precheck(self, new_event, year):
+        # Cheap, deterministic rules. Returns ("accept" | "reject" | "escalate", reason)
+        with self.lock:
+            if not new_event.strip(): return "reject", "The event is empty. What happened?"
+            if normalize_event(new_event) in self.texts:
+                return "reject", f"That event is already on the timeline (year {self.texts[normalize_event(new_event)]})."
+            names = self.find_names(new_event)
+            if year is not None:
+                for name in sorted(names):
+                    intro = self.introduced.get(name)
+                    if intro is not None and year < intro and not INTRO_PATTERN.search(new_event):
+                        return "reject", f"{name.upper()} isn't introduced until {intro}, so they can't be in {year}."
+            nearby = year is not None and bisect.bisect_right(self.by_year, (year + TIMELINE_YEAR_WINDOW, "\uffff")) > bisect.bisect_left(self.by_year, (year - TIMELINE_YEAR_WINDOW, ""))
+            if not names and year is not None and not nearby:
+                return "accept", "No known characters and nothing else happens around that year."
+            return "escalate", ""
+
+    def update_summary(self):
+        # Fold the oldest un-summarized events into the summary, one batch per call
+        with self.lock:
+            pending = [h for h in self.order if h not in self.summarized]
+            if len(pending) < TIMELINE_SUMMARY_BATCH: return
+            batch = pending[:TIMELINE_SUMMARY_BATCH]
+            lines = "\n".join(f"- {self.events[h]['label']}: {self.events[h]['text']}" for h in batch)
+            summary = self.summary
+        prompt = (f"You keep the official history of a comic book universe.\nCURRENT SUMMARY:\n{summary or '(empty)'}\n"
+                  f"NEW EVENTS:\n{lines}\nRewrite the summary to include the new events. Keep every character's key facts "
+                  f"(births, deaths, relationships, powers gained or lost) and their years. Max {TIMELINE_SUMMARY_MAX_WORDS} words.")
+        new_summary = generate_ai_content(prompt)
+        if new_summary.startswith("⚠️"): return
+        with self.lock:
+            self.summary = new_summary.strip()
+            self.summarized.update(batch)
+            self.summarized &= set(self.order)
+            with open(TIMELINE_SUMMARY_FILE + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"summary": self.summary, "summarized": sorted(self.summarized)}, f)
+            os.replace(TIMELINE_SUMMARY_FILE + ".tmp", TIMELINE_SUMMARY_FILE)
+
+    def build_prompt(self, new_event, year):
+        history = "\n".join(f"- {e['label']}: {e['text']}" for e in self.relevant(year, new_event))
+        return (f"Analyze timeline consistency.\nSTORY SO FAR (summary):\n{self.summary or '(nothing summarized yet)'}\n"
+                f"RELEVANT HISTORY:\n{history or '(none)'}\nNEW EVENT ({year if year is not None else 'year unknown'}): {new_event}\n"
+                f"Does this contradict logic? Answer YES or NO with reason.")
+
+@st.cache_resource
+def get_timeline_context():
+    return TimelineContext()
+
+def check_timeline_logic(new_event, existing_df, on_chunk=None, year=None):
     if existing_df.empty: return True, ""
-    history = existing_df['Event'].tolist()
-    history_str = "\n".join(history)
-    prompt = f"Analyze timeline consistency.\nHISTORY:\n{history_str}\nNEW EVENT: {new_event}\nDoes this contradict logic? Answer YES or NO with reason."
-    ai_check = generate_ai_content(prompt)
+    context = get_timeline_context()
+    context.refresh(existing_df, get_roster_names())
+    # Local rules first: obvious answers never leave the computer
+    verdict, reason = context.precheck(new_event, to_year(year))
+    if verdict == "reject": return False, f"👮 LOCAL CHECK: {reason}"
+    if verdict == "accept": return True, ""
+    context.update_summary()
+    prompt = context.build_prompt(new_event, to_year(year))
+    # on_chunk(text_so_far) lets the page show the Logic Cop's reasoning live
+    ai_check = ""
+    for chunk in generate_ai_content(prompt, stream=True):
+        ai_check += chunk
+        if on_chunk: on_chunk(ai_check)
     if "YES" in ai_check.upper(): return False, ai_check
     return True, ""
 
+# --- HERO CHAT ---
+# Chat prompts are packed, not dumped: the hero's own row plus only the heroes
+# they're connected to in the SAME universe file, cut to CHAT_CONTEXT_TOKENS.
+# The packed block is cached per hero until that universe file changes.
+CHAT_CONTEXT_TOKENS = 900
+CHAT_FIELD_CHARS = 300     # long lore fields are clipped in the hero's own block...
+CHAT_RELATED_CHARS = 160   # ...and harder on the cards for the people they know
+CHAT_RECENT_TURNS = 6        # messages kept word-for-word (ring buffer)...
+CHAT_SUMMARY_BATCH = 4       # ...older ones are folded into the summary this many at a time
+CHAT_PENDING_MAX = 2 * CHAT_SUMMARY_BATCH # unsummarized overflow kept while summaries fail (AI outage)
+CHAT_SUMMARY_MAX_WORDS = 120
+CHAT_HISTORY_DIR = "chat_history"
+RELATION_ORDER = {"family": 0, "ally": 1, "enemy": 2}
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for a budget
+    return len(text) // 4 + 1
+
+def clip(text, limit):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+def universe_signature(universe_file):
+    if using_sqlite(): return roster_signature()
+    try:
+        stat = os.stat(universe_file)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+def pack_hero_context(universe_file, hero):
+    df = load_data(universe_file, FULL_CHAR_COLUMNS)
+    rows = df[df["Hero Name"] == hero]
+    if rows.empty: return ""
+    row = rows.iloc[0]
+    lines = [f"WHO YOU ARE ({row['Universe'] or universe_file}):"]
+    lines += [f"- {col}: {clip(row[col], CHAT_FIELD_CHARS)}" for col in FULL_CHAR_COLUMNS if col != "Image_Path" and str(row[col]).strip()]
+    budget = CHAT_CONTEXT_TOKENS - estimate_tokens("\n".join(lines))
+
+    # People they know, closest ties first; anyone outside this universe file is skipped
+    graph = get_relationship_graph().refresh()
+    same_universe = {r["Hero Name"]: r for r in df.to_dict("records")}
+    related = sorted(((o, e) for o, e in graph.neighbors(hero).items() if o in same_universe),
+                     key=lambda item: min(RELATION_ORDER[k] for k in item[1]["kinds"]))
+    known = []
+    for other, edge in related:
+        r = same_universe[other]
+        how = ", ".join(sorted(edge["labels"])) or " & ".join(RELATION_WORDS[k] for k in sorted(edge["kinds"]))
+        line = f"- {other} ({how}): {r['Role']}. {clip(r['Super Power'], CHAT_RELATED_CHARS)}"
+        if estimate_tokens(line) > budget: break
+        budget -= estimate_tokens(line)
+        known.append(line)
+    if known: lines += ["PEOPLE YOU KNOW:"] + known
+
+    others = [n for n in same_universe if n != hero and n not in graph.adj.get(hero, {})]
+    if others:
+        line = "ALSO IN YOUR UNIVERSE: " + ", ".join(others)
+        if estimate_tokens(line) <= budget: lines.append(line)
+    return "\n".join(lines)
+
+class ChatContextCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}  # (universe file, hero) -> (file signature, packed block)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, universe_file, hero):
+        key, signature = (universe_file, hero), universe_signature(universe_file)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+        block = pack_hero_context(universe_file, hero)
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = (signature, block)
+        return block
+
+@st.cache_resource
+def get_chat_context_cache():
+    return ChatContextCache()
+
+# Each prompt carries the running summary + the last CHAT_RECENT_TURNS messages,
+# so its size stays flat however long the conversation gets. Memory is saved per
+# hero in CHAT_HISTORY_DIR and picked up again next time.
+class ChatMemory:
+    def __init__(self, universe_file, hero):
+        self.hero = hero
+        self.path = os.path.join(CHAT_HISTORY_DIR, f"{re.sub(r'[^a-zA-Z0-9]', '_', universe_file)}__{re.sub(r'[^a-zA-Z0-9]', '_', hero)}.json")
+        self.recent = deque(maxlen=CHAT_RECENT_TURNS)
+        self.pending = []    # pushed out of the ring buffer, not summarized yet
+        self.summary = ""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self.recent.extend(saved.get("recent", []))
+            self.pending = saved.get("pending", [])[-CHAT_PENDING_MAX:]
+            self.summary = saved.get("summary", "")
+        except (OSError, ValueError):
+            pass
+
+    def speaker(self, m):
+        return "JOE" if m["role"] == "user" else self.hero
+
+    def add(self, role, text):
+        if len(self.recent) == self.recent.maxlen: self.pending.append(self.recent[0])
+        self.recent.append({"role": role, "text": text})
+        # Summaries failing (AI down) -> drop the oldest overflow so the prompt stays bounded
+        del self.pending[:-CHAT_PENDING_MAX]
+
+    def update_summary(self):
+        if len(self.pending) < CHAT_SUMMARY_BATCH: return
+        batch = self.pending[:CHAT_SUMMARY_BATCH]
+        lines = "\n".join(f"{self.speaker(m)}: {m['text']}" for m in batch)
+        prompt = (f"You keep notes on a chat between Joe and his comic character {self.hero}.\nNOTES SO FAR:\n{self.summary or '(empty)'}\n"
+                  f"NEW MESSAGES:\n{lines}\nRewrite the notes to include the new messages. Keep names, promises, plans and "
+                  f"anything Joe told {self.hero} about himself. Max {CHAT_SUMMARY_MAX_WORDS} words.")
+        new_summary = generate_ai_content(prompt)
+        if new_summary.startswith("⚠️"): return
+        self.summary = new_summary.strip()
+        self.pending = self.pending[CHAT_SUMMARY_BATCH:]
+
+    def save(self):
+        os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary, "pending": self.pending, "recent": list(self.recent)}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def clear(self):
+        self.recent.clear()
+        self.pending, self.summary = [], ""
+        if os.path.exists(self.path): os.remove(self.path)
+
+    def prompt_block(self):
+        # Not-yet-summarized overflow rides along verbatim until the next fold
+        earlier = f"WHAT YOU TWO TALKED ABOUT BEFORE:\n{self.summary}\n\n" if self.summary else ""
+        return earlier + "\n".join(f"{self.speaker(m)}: {m['text']}" for m in self.pending + list(self.recent))
+
+def get_chat_memory(universe_file, hero):
+    memories = st.session_state.setdefault("chat_memory", {})
+    key = f"{universe_file}|{hero}"
+    if key not in memories: memories[key] = ChatMemory(universe_file, hero)
+    return memories[key]
+
+def build_chat_prompt(hero, context, memory, message):
+    return f"""You are {hero}, a comic book character created by a kid named Joe. Stay in character.
+Keep it fun, kid-friendly and under 120 words. Use the facts below; if something isn't there, invent something that fits.
+
+{context}
+
+{memory.prompt_block()}
+JOE: {message}
+{hero}:"""
+
 # ==========================================
 # 5. STARTUP LOGIC
 # ==========================================
 if 'script_text' not in st.session_state: st.session_state['script_text'] = "TITLE: \nISSUE: \n\n[PAGE 1]\n"
 if 'roster_loaded' not in st.session_state:
-    if not glob.glob("universe_*.csv"):
+    if not list_universe_files():
         if initialize_roster(): st.toast("🚀 Auto-loaded Full Roster!", icon="🦸")
     if os.path.exists("comic_story1.png"):
         save_portfolio_entry("Example Comic", "1", "An automated example of the comic studio portfolio.", local_path="comic_story1.png")
@@ -506,13 +2305,13 @@ st.sidebar.divider()
 # --- 2. API KEY INPUT ---
 api_key_input = st.sidebar.text_input("Paste Google API Key here:", type="password")
 
-if not api_key_input:
+if not api_key_input and not AI_STUB:
     st.warning("👈 Please paste your Google API Key in the sidebar to start!")
     st.stop() 
 
 # --- 3. CONFIGURE AI ---
 try:
-    genai.configure(api_key=api_key_input)
+    if api_key_input: genai.configure(api_key=api_key_input)
 except Exception as e:
     st.error(f"API Key Error: {e}")
     st.stop()
@@ -532,21 +2331,39 @@ if remaining <= 0:
 st.sidebar.markdown("---")
 st.sidebar.title("🦇 Studio Tools")
 if st.sidebar.button("🔄 Reload Roster"):
-    with st.spinner("Rebuilding Universe files..."):
-        if initialize_roster():
-            st.success("Universes Synced!")
+    with st.spinner("Syncing Universe files..."):
+        sync_result = initialize_roster()
+        if sync_result:
+            st.success(f"Universes Synced! ({sync_result['changed']} updated, {sync_result['removed']} removed)")
+            flagged = st.session_state.get("safety_findings", {}).get("roster", [])
+            if flagged: st.warning(f"🛡️ {len(flagged)} roster fields tripped the shields (see Security Logs).")
             time.sleep(1)
             st.rerun()
         else:
             st.error("Could not find roster_completed.csv")
 
+if st.sidebar.button("🖼️ Warm Thumbnail Cache"):
+    with st.spinner("Pre-rendering thumbnails..."):
+        st.sidebar.success(f"{warm_thumbnail_cache()} thumbnails ready!")
+
 # --- ADMIN LOGIN ---
 if st.sidebar.checkbox("Admin Access"):
     admin_pwd = st.sidebar.text_input("Password", type="password")
     if admin_pwd == DAD_PASSWORD: 
+        cache_stats = get_roster_store().stats()
+        st.sidebar.caption(f"📦 Roster cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['files']} files)")
+        ai_stats = get_response_cache().stats()
+        st.sidebar.caption(f"🤖 AI cache: {ai_stats['hits']} hits / {ai_stats['misses']} misses ({ai_stats['hit_rate']:.0%} hit rate, {ai_stats['entries']} saved)")
+        chat_stats = get_chat_context_cache()
+        st.sidebar.caption(f"💬 Chat context cache: {chat_stats.hits} hits / {chat_stats.misses} misses")
+        for source, findings in st.session_state.get("safety_findings", {}).items():
+            if findings: st.sidebar.caption(f"🛡️ {source}: {len(findings)} flagged")
+        log_type = st.sidebar.selectbox("Event Type", ["All"] + security_log_types())
+        include_archives = st.sidebar.checkbox("Include archived logs")
         if st.sidebar.button("View Security Logs"):
-            if os.path.exists(LOG_FILE):
-                st.sidebar.dataframe(pd.read_csv(LOG_FILE))
+            log_df = read_security_log(None if log_type == "All" else log_type, include_archives)
+            if log_df is not None:
+                st.sidebar.dataframe(log_df)
             else:
                 st.sidebar.info("No security incidents logged.")
 
@@ -558,6 +2375,7 @@ mode = st.sidebar.radio("Go to:", [
     "📝 Script Writer", 
     "📚 Portfolio", 
     "🎲 Idea Generator",
+    "🔎 Search",
     "❓ Help / Tutorial" 
 ])
 
@@ -565,17 +2383,61 @@ mode = st.sidebar.radio("Go to:", [
 # 7. MAIN APP LOGIC
 # ==========================================
 
-if mode == "🦸 Character Dashboard":
+if mode == "💬 Chat with Hero":
+    st.title("💬 Chat with Hero")
+    universe_files = list_universe_files()
+    if not universe_files:
+        st.error("No universe files found!")
+        st.stop()
+    c1, c2 = st.columns(2)
+    chat_file = c1.selectbox("Universe:", universe_files)
+    chat_heroes = [n for n in load_data(chat_file, ["Hero Name"])["Hero Name"] if n.strip()]
+    if not chat_heroes:
+        st.info("No heroes in this universe yet.")
+        st.stop()
+    chat_hero = c2.selectbox("Talk to:", chat_heroes)
+    st.markdown(f"""<div style="background-image: url('{banner_chat_bg}'); background-size: cover; padding: 20px; border: 3px solid black; border-radius: 5px; margin-bottom: 15px;">
+        <h2 style="margin:0;">📡 LIVE LINK: {chat_hero}</h2></div>""", unsafe_allow_html=True)
+
+    memory = get_chat_memory(chat_file, chat_hero)
+    if memory.summary:
+        with st.expander("📜 Earlier in this conversation"): st.write(memory.summary)
+    for m in memory.recent:
+        st.markdown(f"""<div class="{'user-msg' if m['role'] == 'user' else 'ai-msg'}">{m['text']}</div>""", unsafe_allow_html=True)
+
+    message = st.chat_input(f"Say something to {chat_hero}...")
+    if message:
+        safe, warning = check_safety(message)
+        if not safe:
+            st.error(warning)
+        else:
+            st.markdown(f"""<div class="user-msg">{message}</div>""", unsafe_allow_html=True)
+            prompt = build_chat_prompt(chat_hero, get_chat_context_cache().get(chat_file, chat_hero), memory, message)
+            bubble = st.empty()
+            reply = ""
+            for chunk in generate_ai_content(prompt, stream=True):
+                reply += chunk
+                bubble.markdown(f"""<div class="ai-msg">{reply}</div>""", unsafe_allow_html=True)
+            if not reply.startswith("⚠️"):
+                memory.add("user", message)
+                memory.add("hero", reply)
+                memory.update_summary()
+                memory.save()
+    if (memory.recent or memory.summary) and st.button("🧹 Start a New Conversation"):
+        memory.clear()
+        st.rerun()
+
+elif mode == "🦸 Character Dashboard":
     st.title("Character Vault")
     
     # Simple Universe Selector for the dashboard
     # (Ensuring view_file is defined before we use it)
-    universe_files = [f for f in os.listdir() if f.startswith("universe_") and f.endswith(".csv")]
+    universe_files = list_universe_files()
     if not universe_files:
         st.error("No universe files found!")
         st.stop()
         
-    view_file = st.selectbox("Select Universe:", universe_files, index=0)
+    view_file = st.selectbox("Select Universe:", universe_files + [ALL_UNIVERSES], index=0)
 # ==========================================
     # ➕ PASTE THIS: CREATE / EDIT FORM
     # ==========================================
@@ -613,7 +2475,9 @@ if mode == "🦸 Character Dashboard":
                         new_char_data[col] = st.session_state[k]
                 
                 # 2. Save
-                save_character(view_file, new_char_data, uploaded_char_img)
+                # "All universes" saves back to the hero's own file (or the first universe for new heroes)
+                target_file = view_file if view_file != ALL_UNIVERSES else st.session_state.get("edit_source_file", universe_files[0])
+                save_character(target_file, new_char_data, uploaded_char_img)
                 st.success(f"{new_char_data['Hero Name']} Saved!")
                 time.sleep(0.5)
                 st.rerun()
@@ -623,14 +2487,40 @@ if mode == "🦸 Character Dashboard":
     st.divider()
     # ==========================================    
     # Load Data
-    df = load_data(view_file, FULL_CHAR_COLUMNS)
+    df = load_vault(universe_files if view_file == ALL_UNIVERSES else [view_file])
+
+    # --- SEARCH + PAGINATION ---
+    # Filtering is vectorized over the whole roster; only the current page's cards are built
+    f1, f2, f3 = st.columns([3, 2, 1])
+    vault_query = f1.text_input("🔎 Search Hero Name, Role or Universe", key="vault_query")
+    roles = sorted(r for r in df["Role"].unique() if r) if not df.empty else []
+    vault_role = f2.selectbox("Role", ["All Roles"] + roles, key="vault_role")
+    page_size = f3.selectbox("Per Page", VAULT_PAGE_SIZES, index=1, key="vault_page_size")
+    df = filter_vault(df, vault_query, None if vault_role == "All Roles" else vault_role)
+
+    page_count = max(1, -(-len(df) // page_size))
+    filter_sig = (view_file, vault_query, vault_role, page_size)
+    if st.session_state.get("vault_filter_sig") != filter_sig:
+        st.session_state["vault_filter_sig"] = filter_sig
+        st.session_state["vault_page"] = 1
+    st.session_state["vault_page"] = min(st.session_state.get("vault_page", 1), page_count)
 
     if not df.empty:
+        p1, p2, p3 = st.columns([1, 2, 1])
+        p1.button("⬅️ Prev", disabled=st.session_state["vault_page"] <= 1, key="vault_prev",
+                  on_click=lambda: st.session_state.update(vault_page=st.session_state["vault_page"] - 1))
+        p2.markdown(f"<p style='text-align:center;'>Page {st.session_state['vault_page']} of {page_count} · {len(df)} heroes</p>", unsafe_allow_html=True)
+        p3.button("Next ➡️", disabled=st.session_state["vault_page"] >= page_count, key="vault_next",
+                  on_click=lambda: st.session_state.update(vault_page=st.session_state["vault_page"] + 1))
+        first = (st.session_state["vault_page"] - 1) * page_size
+        page_df = df.iloc[first:first + page_size]
+
         cols = st.columns(2)
-        for index, row in df.iterrows():
-            with cols[index % 2]:
+        for slot, (index, row) in enumerate(page_df.iterrows()):
+            card_key = f"{row['_source_file']}_{index}"
+            with cols[slot % 2]:
                 st.markdown(f"""
-                <div style="background-image: url('data:image/jpg;base64,{banner_char_bg}'); background-size: cover; padding: 10px; border: 3px solid black; border-radius: 5px; margin-bottom: 15px; box-shadow: 5px 5px 0px rgba(0,0,0,0.5);">
+                <div style="background-image: url('{banner_char_bg}'); background-size: cover; padding: 10px; border: 3px solid black; border-radius: 5px; margin-bottom: 15px; box-shadow: 5px 5px 0px rgba(0,0,0,0.5);">
                 """, unsafe_allow_html=True)
 
                 # --- CLOUD IMAGE FIX START ---
@@ -643,8 +2533,8 @@ if mode == "🦸 Character Dashboard":
                 cloud_path = f"character_images/{filename}"
 
                 # 4. Check if exists
-                if os.path.exists(cloud_path):
-                    st.image(cloud_path, use_column_width=True) 
+                if os.path.isfile(cloud_path):
+                    st.image(get_thumbnail(cloud_path, VAULT_THUMB_WIDTH), width="stretch")
                 else:
                     st.markdown(f"<div style='height:150px; background-color: white; border: 2px dashed black; display:flex; align-items:center; justify-content:center; color:red;'>Missing: {filename}</div>", unsafe_allow_html=True)
                 # --- CLOUD IMAGE FIX END ---
@@ -658,6 +2548,9 @@ if mode == "🦸 Character Dashboard":
                 """, unsafe_allow_html=True)
                 
                 with st.expander("📂 View Full Dossier"):
+                    # Full-resolution art is only sent when asked for
+                    if os.path.isfile(cloud_path) and st.checkbox("🔍 Show full-size art", key=f"full_{card_key}"):
+                        st.image(cloud_path, width="stretch")
                     for col in FULL_CHAR_COLUMNS:
                         if col != "Image_Path" and row[col]:
                             st.write(f"**{col}:** {row[col]}")
@@ -666,11 +2559,12 @@ if mode == "🦸 Character Dashboard":
                 def load_edit(r):
                     for col in FULL_CHAR_COLUMNS:
                         st.session_state[f"edit_{col}"] = r[col]
+                    st.session_state["edit_source_file"] = r["_source_file"]
                 
-                st.button(f"✏️ Edit {row['Hero Name']}", key=f"edit_{index}", on_click=load_edit, args=(row,))
+                st.button(f"✏️ Edit {row['Hero Name']}", key=f"edit_{card_key}", on_click=load_edit, args=(row,))
 
-                if st.button(f"Delete {row['Hero Name']}", key=f"del_{index}"):
-                    delete_character(view_file, row['Hero Name'])
+                if st.button(f"Delete {row['Hero Name']}", key=f"del_{card_key}"):
+                    delete_character(row['_source_file'], row['Hero Name'])
                     st.rerun()
     else: 
         st.info("No heroes found.")
@@ -681,28 +2575,42 @@ elif mode == "⏳ Timeline":
     
     # --- INDENTATION FIX WAS HERE ---
     c1, c2 = st.columns([1, 2])
-    df_t = load_data(TIMELINE_FILE, ["Year", "Event", "Type"])
+    df_t = load_data(TIMELINE_FILE, TIMELINE_COLUMNS)
 
     with c1:
         t_year = st.text_input("Year", value="2024")
         t_event = st.text_area("Event")
         
         if st.button("Add to Timeline"):
+            cop_report = st.empty()
             with st.spinner("Logic Cop is checking consistency..."):
-                consistent, reason = check_timeline_logic(t_event, df_t)
+                consistent, reason = check_timeline_logic(t_event, df_t, year=t_year, on_chunk=lambda text: cop_report.caption(f"👮 {text}"))
+            cop_report.empty()
             
             if consistent:
+                st.session_state.pop("timeline_rejected", None)
                 save_timeline_event(t_year, t_event, "Event")
                 st.success("Event Added!")
                 st.rerun()
             else:
-                st.error(f"LOGIC ERROR DETECTED: {reason}")
-                if st.button("Force Add Anyway (Multiverse Logic)"):
-                    save_timeline_event(t_year, t_event, "Event")
-                    st.rerun()
+                # Kept across the rerun the override button causes (a button
+                # nested under another button's branch can never fire)
+                st.session_state["timeline_rejected"] = {"year": t_year, "event": t_event, "reason": reason}
+
+        rejected = st.session_state.get("timeline_rejected")
+        if rejected and (rejected["year"], rejected["event"]) != (t_year, t_event):
+            del st.session_state["timeline_rejected"] # Edited since -> stale verdict
+            rejected = None
+        if rejected:
+            st.error(f"LOGIC ERROR DETECTED: {rejected['reason']}")
+            if st.button("Force Add Anyway (Multiverse Logic)"):
+                save_timeline_event(rejected["year"], rejected["event"], "Event")
+                del st.session_state["timeline_rejected"]
+                st.rerun()
                     
     with c2:
-        for index, row in df_t.iterrows():
+        # Appends land unsorted until the next compaction -> sort for display
+        for index, row in sort_timeline(df_t).iterrows():
             st.markdown(f"<div style='background:rgba(0,0,0,0.5); padding:10px; margin:5px; border-left:4px solid yellow; color:white;'><b>{row['Year']}</b>: {row['Event']}</div>", unsafe_allow_html=True)
 
 elif mode == "📝 Script Writer":
@@ -711,48 +2619,137 @@ elif mode == "📝 Script Writer":
     
     # Load existing scripts
     if not os.path.exists(SCRIPT_DIR): os.makedirs(SCRIPT_DIR) # Safety check
-    scripts = glob.glob(os.path.join(SCRIPT_DIR, "*.txt"))
-    script_names = [os.path.basename(s) for s in scripts]
-    selected_script = st.selectbox("📂 Load Previous Script", ["New Script"] + script_names)
-    
-    if selected_script != "New Script":
-        loaded_content = load_script_file(selected_script)
-        if 'script_text' not in st.session_state or st.session_state['script_text'] != loaded_content:
-            st.session_state['script_text'] = loaded_content
+    script_names = cached_script_files()
+    selected_script = st.selectbox("📂 Load Previous Script", ["New Script"] + script_names, key="script_select")
+    script_session = get_script_session()
+    script_session.select(selected_script)
     
     s_title = st.text_input("Script Title", value=selected_script.replace(".txt", "") if selected_script != "New Script" else "New Script")
-    st.text_area("Content", height=400, key="script_text")
+    st.text_area("Content", height=400, key="script_text", on_change=script_session.touch)
+    script_autosave_status()
     
-    c1, c2 = st.columns(2)
+    c1, c2, c3 = st.columns(3)
     with c1:
         # Check if content exists before download to prevent error
         content_to_download = st.session_state.get('script_text', "")
         st.download_button("Download to Computer", content_to_download, file_name=f"{s_title}.txt")
     with c2:
         if st.button("💾 Save to Script Archive"):
-            fname = save_script_file(s_title, st.session_state.get('script_text', ""))
+            fname = script_session.save(s_title)
             st.success(f"Saved to {SCRIPT_DIR}/{fname}")
+            flagged = st.session_state.get("safety_findings", {}).get(f"script:{fname}", [])
+            if flagged:
+                st.warning(f"🛡️ {len(flagged)} panel(s) tripped the shields:")
+                for f in flagged: st.caption(f"• {f['category']}: \"{f['text'][f['span'][0]:f['span'][1]]}\" in \"{f['text'][:80]}\"")
+    with c3:
+        def delete_selected_script(filename):
+            delete_script_file(filename)
+            script_session.selected, script_session.dirty = "New Script", False
+            st.session_state["script_select"] = "New Script"
+        if selected_script != "New Script":
+            st.button("🗑️ Delete Script", on_click=delete_selected_script, args=(selected_script,))
+
+    history = get_script_history()
+    versions = script_session.versions()
+    if versions:
+        with st.expander(f"🕓 Version History ({len(versions)} saves)"):
+            labels = {v["version"]: f"v{v['version']} · {v['saved_at']} · {v['size']:,} chars" for v in versions}
+            h1, h2 = st.columns(2)
+            old_v = h1.selectbox("Compare", list(labels)[::-1], index=min(1, len(labels) - 1), format_func=labels.get)
+            new_v = h2.selectbox("With", list(labels)[::-1], format_func=labels.get)
+            # Diffing reads version objects from disk -> only when asked, not on every keystroke
+            if st.toggle("🔍 Show changes", key="history_show_diff"):
+                changes = history.diff(selected_script, old_v, new_v)
+                if changes: st.code(changes, language="diff")
+                else: st.info("No differences.")
+                h_stats = history.stats()
+                st.caption(f"🗄️ Archive: {h_stats['objects']} stored pages, {h_stats['bytes'] / 1024:.1f} KB")
+
+            def restore_version(filename, version):
+                content = history.load(filename, version)
+                save_script_file(filename.replace(".txt", ""), content)
+                st.session_state['script_text'] = content
+                script_session.dirty, script_session.history = False, None
+            st.button(f"↩️ Restore v{old_v}", on_click=restore_version, args=(selected_script, old_v))
+
+    # Parsed once per rerun; the preview, export and breakdown all share it
+    parser = get_script_parser()
+    script_tree = parser.parse(selected_script, st.session_state.get('script_text', ""))
+
+    with st.expander("🖼️ Preview Pages"):
+        if st.button("🎨 Render Pages"):
+            with st.spinner("Inking the panels..."):
+                rendered = render_script_pages(script_tree)
+            if not rendered: st.info("Add a [PAGE 1] heading to see your pages.")
+            cols = st.columns(2)
+            for i, page in enumerate(rendered):
+                cols[i % 2].image(page["path"], caption=f"PAGE {page['number']}", width="stretch")
+            if rendered: st.caption(f"⚡ {sum(p['drawn'] for p in rendered)} panel(s) drawn, {sum(p['cached'] for p in rendered)} reused from cache")
+
+    with st.expander("📦 Export Issue"):
+        x1, x2 = st.columns(2)
+        export_fmt = x1.radio("Format", list(EXPORT_FORMATS), key="script_export_fmt", horizontal=True)
+        issue = str(script_tree["issue"] or "").strip().lstrip("#")
+        with_art = x2.checkbox(f"Add portfolio art for issue #{issue}" if issue else "Add portfolio art (no ISSUE: line found)", disabled=not issue, key="script_export_art")
+        if st.button("📦 Export Issue", key="script_export"):
+            with st.spinner("Binding the issue..."):
+                paths = [page["path"] for page in render_script_pages(script_tree)]
+                if with_art: paths += portfolio_images(issue)
+                if paths: export_path, count = export_issue(script_tree["title"] or s_title, paths, EXPORT_FORMATS[export_fmt])
+            if paths: show_export_link(export_path, count)
+            else: st.info("Add a [PAGE 1] heading to see your pages.")
+
+    with st.expander("📊 Script Breakdown"):
+        stats = script_breakdown(script_tree, get_hero_aliases())
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Pages", stats["pages"])
+        m2.metric("Panels", stats["panels"])
+        m3.metric("Lines", stats["lines"])
+        m4.metric("Words", stats["words"])
+        if not stats["cast"].empty:
+            st.markdown("**🎭 Who talks the most**")
+            st.dataframe(stats["cast"], hide_index=True, use_container_width=True)
+        if stats["refs"]:
+            st.markdown("**🦸 Vault heroes in this script**")
+            for hero, pages in stats["refs"].items(): st.write(f"• **{hero}**: page {', '.join(map(str, pages))}")
+        for page in script_tree["pages"]:
+            st.caption(f"PAGE {page['number']}: {len(page['panels'])} panel(s), {sum(len(p['dialogue']) for p in page['panels'])} line(s)")
+        st.caption(f"⚡ Parser: {parser.parsed} page(s) parsed, {parser.reused} reused from cache")
 
 elif mode == "🎲 Idea Generator":
     st.title("The Idea Machine ⚡")
     st.markdown(f"""<div style="background-color: #2b313e; color: white; padding: 20px; border-radius: 10px; border: 2px solid #00adb5; margin-bottom: 20px;"><h3>🤖 AI SCENARIO GENERATOR</h3></div>""", unsafe_allow_html=True)
     genre = st.selectbox("Choose Genre:", ["Action Crossover", "Mystery", "Comedy", "Dark Sci-Fi", "Daily Life"])
+    pairing = st.radio("Pair heroes who are...", PAIRING_STRATEGIES, horizontal=True)
+    fresh_idea = st.checkbox("🎲 Give me something new (don't reuse a saved idea)")
+    graph = get_relationship_graph().refresh()
     if st.button("⚡ Generate Crossover Event", type="primary", use_container_width=True):
-        universe_files = glob.glob("universe_*.csv")
-        all_chars = []
-        for f in universe_files:
-            df = load_data(f, FULL_CHAR_COLUMNS)
-            if not df.empty: all_chars.extend(df.to_dict('records'))
-        if len(all_chars) < 2:
+        pair = graph.pick_pair(pairing)
+        if pair is None and len(graph.heroes) >= 2:
+            st.info(f"No pair in the Vault fits '{pairing}' yet, so the Multiverse picked at random.")
+            pair = graph.pick_pair("🎲 Random")
+        if pair is None:
             st.warning("⚠️ You need at least 2 characters in your Vault to generate a crossover!")
         else:
             with st.spinner("Consulting the Multiverse..."):
-                c1 = random.choice(all_chars)
-                c2 = random.choice(all_chars)
-                while c2['Hero Name'] == c1['Hero Name'] and len(all_chars) > 1: c2 = random.choice(all_chars)
-                prompt = f"Write a comic book plot outline for a '{genre}' story. Starring {c1['Hero Name']} and {c2['Hero Name']}."
-                ai_response = generate_ai_content(prompt)
-                st.markdown(f"""<div class="gen-card"><h2 style="color:black; text-shadow:none;">✨ {genre.upper()} EVENT GENERATED</h2><p style="color:black;"><b>Starring:</b> {c1['Hero Name']} & {c2['Hero Name']}</p><hr style="border-top: 2px dashed black;">{ai_response}</div>""", unsafe_allow_html=True)
+                c1, c2 = [{"Hero Name": name} for name in pair]
+                prompt = f"Write a comic book plot outline for a '{genre}' story. Starring {c1['Hero Name']} and {c2['Hero Name']}. {graph.describe(*pair)}"
+                # The card fills in as the story streams in
+                gen_card = st.empty()
+                ai_response = ""
+                for chunk in generate_ai_content(prompt, use_cache=not fresh_idea, stream=True):
+                    ai_response += chunk
+                    gen_card.markdown(f"""<div class="gen-card"><h2 style="color:black; text-shadow:none;">✨ {genre.upper()} EVENT GENERATED</h2><p style="color:black;"><b>Starring:</b> {c1['Hero Name']} & {c2['Hero Name']}</p><hr style="border-top: 2px dashed black;">{ai_response}</div>""", unsafe_allow_html=True)
+
+    with st.expander("🕸️ Relationship Web"):
+        g1, g2 = st.columns([3, 1])
+        focus = g1.selectbox("Center on", ["Everyone"] + sorted(graph.heroes.values()))
+        depth = g2.slider("Steps out", 1, 3, 1)
+        if graph.adj:
+            st.graphviz_chart(graph.to_dot(None if focus == "Everyone" else focus, depth))
+            st.caption("🟥 enemies · 🟦 allies · 🟩 family")
+        else:
+            st.info("Fill in Relationships, Allies or Enemies to grow the web.")
 
 elif mode == "📚 Portfolio":
     st.title("Professional Portfolio 🎨")
@@ -769,7 +2766,7 @@ elif mode == "📚 Portfolio":
                 st.success("Uploaded!")
                 st.rerun()
     with tab2:
-        df_p = load_data(PORTFOLIO_FILE, ["Title", "Issue", "Description", "Image_Path"])
+        df_p = load_data(PORTFOLIO_FILE, PORTFOLIO_COLUMNS)
         if not df_p.empty:
             cols = st.columns(3)
             for index, row in df_p.iterrows():
@@ -780,13 +2777,52 @@ elif mode == "📚 Portfolio":
                         p_filename = os.path.basename(clean_p_path)
                         cloud_p_path = f"portfolio_images/{p_filename}"
                         
-                        if os.path.exists(cloud_p_path):
-                            st.image(cloud_p_path, use_column_width=True) 
+                        if os.path.isfile(cloud_p_path):
+                            st.image(get_thumbnail(cloud_p_path, GALLERY_THUMB_WIDTH), width="stretch")
                     
                     st.markdown(f"**{row['Title']}** #{row['Issue']}")
                     st.caption(row['Description'])
         else: st.info("No art uploaded yet.")
 
+        with st.expander("📦 Export Issue"):
+            issues = portfolio_issues()
+            e1, e2 = st.columns(2)
+            export_pick = e1.selectbox("Issue", ["All Art"] + [f"#{i}" for i in issues], key="portfolio_export_issue")
+            export_fmt = e2.radio("Format", list(EXPORT_FORMATS), key="portfolio_export_fmt", horizontal=True)
+            scripts = [""] + cached_script_files()
+            export_script = st.selectbox("Add the pages of a script (optional)", scripts, key="portfolio_export_script")
+            if st.button("📦 Export Issue", key="portfolio_export"):
+                issue = None if export_pick == "All Art" else export_pick[1:]
+                paths = portfolio_images(issue)
+                with st.spinner("Binding the issue..."):
+                    if export_script:
+                        tree = get_script_parser().parse(export_script, load_script_file(export_script))
+                        paths += [page["path"] for page in render_script_pages(tree)]
+                    if paths:
+                        export_path, count = export_issue(f"Issue {issue}" if issue else "Portfolio", paths, EXPORT_FORMATS[export_fmt])
+                if paths: show_export_link(export_path, count)
+                else: st.warning("Nothing to export yet.")
+
+elif mode == "🔎 Search":
+    st.title("🔎 Studio Search")
+    st.caption("Search every hero, timeline event, script and portfolio piece at once.")
+    q1, q2 = st.columns([3, 2])
+    search_query = q1.text_input("Search for...", placeholder="e.g. Faraday")
+    search_kinds = q2.multiselect("Only show", list(SEARCH_KINDS), format_func=lambda k: f"{SEARCH_KINDS[k]} {k.title()}")
+    if search_query:
+        started = time.perf_counter()
+        results = get_search_index().search(search_query, search_kinds)
+        st.caption(f"{len(results)} result(s) in {(time.perf_counter() - started) * 1000:.1f} ms")
+        for kind, doc_id, title, snippet, rank in results:
+            where = f" · {doc_id.split('|', 1)[0]}" if kind == "character" else ""
+            st.markdown(f"""<div style="background-color: white; color: black; padding: 10px; border: 2px solid black; border-radius: 5px; margin-bottom: 10px;">
+                <b>{SEARCH_KINDS[kind]} {title}</b><span style="color:gray;">{where}</span></div>""", unsafe_allow_html=True)
+            st.markdown(snippet.replace("\n", " · "))
+        if not results: st.info("Nothing found. Try fewer words.")
+    if st.button("🔄 Rebuild Search Index"):
+        with st.spinner("Re-indexing the studio..."):
+            st.success(f"{get_search_index().rebuild()} documents indexed!")
+
 elif mode == "❓ Help / Tutorial":
     st.title("🎓 HERO ACADEMY: BASIC TRAINING")
     
@@ -882,7 +2918,8 @@ elif mode == "❓ Help / Tutorial":
             **Check the `security_log.csv` file weekly.** This code blocks bad inputs, but it doesn't parent him. The logs will tell you if he's trying to push boundaries.
             """)
             
-            if os.path.exists(LOG_FILE):
-                st.dataframe(pd.read_csv(LOG_FILE).tail(5))
+            log_df = read_security_log()
+            if log_df is not None:
+                st.dataframe(log_df.tail(5))
             else:
                 st.write("No logs yet.")
\ No newline at end of file
@@ -0,0 +1,314 @@
+# ==========================================
+# 📄 COMIC PAGE RENDERER
+# ==========================================
+# Turns parsed script pages (see ScriptParser in comic_app.py) into comic page
+# images with Pillow. Lives in its own module with no Streamlit import so the
+# process pool can pickle these functions and workers start fast.
+#
+# Every panel is drawn as a "tile" and cached on disk under a hash of its text,
+# art and layout, so editing one panel only redraws that panel. The cache folder
+# is kept under CACHE_BUDGET_MB with the same mtime-as-LRU-clock scheme as the
+# thumbnail cache in comic_app.py.
+import io
+import os
+import time
+import json
+import hashlib
+import zipfile
+import multiprocessing
+import textwrap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+
+RENDER_VERSION = 1          # bump when drawing code changes -> old tiles are ignored
+PAGE_SIZE = (1200, 1800)    # 2:3 comic page
+PAGE_MARGIN = 40
+PANEL_GUTTER = 20
+BORDER = 6
+FONT_SIZE = 26
+CAPTION_FONT_SIZE = 22
+BALLOON_PADDING = 14
+BALLOON_MAX_CHARS = 28      # characters per line inside a balloon
+MAX_PANELS_PER_ROW = 3
+PNG_LEVEL = 1               # cache files favour fast writes over small size
+CACHE_BUDGET_MB = 1024      # tiles + pages; least recently used go first past this
+EXPORT_MAX_WIDTH = 1600     # exported pages are scaled down to this width
+EXPORT_QUALITY = 85
+EXPORT_DPI = 150            # PDF page size = pixels at this resolution
+EXPORT_IN_FLIGHT = 4        # images being recompressed at once -> bounds memory
+
+def load_font(size):
+    for name in ["DejaVuSans-Bold.ttf", "arialbd.ttf", "Arial Bold.ttf"]:
+        try: return ImageFont.truetype(name, size)
+        except OSError: pass
+    return ImageFont.load_default(size=size)
+
+def row_plan(count):
+    # How many panels go on each row, e.g. 5 -> [2, 1, 2]
+    plans = {1: [1], 2: [1, 1], 3: [1, 2], 4: [2, 2], 5: [2, 1, 2], 6: [2, 2, 2]}
+    if count in plans: return plans[count]
+    rows = [MAX_PANELS_PER_ROW] * (count // MAX_PANELS_PER_ROW)
+    if count % MAX_PANELS_PER_ROW: rows.append(count % MAX_PANELS_PER_ROW)
+    return rows
+
+def layout_panels(count, size=PAGE_SIZE):
+    # -> [(x0, y0, x1, y1), ...] one box per panel, reading order
+    if count == 0: return []
+    width, height = size
+    rows = row_plan(count)
+    row_h = (height - 2 * PAGE_MARGIN - PANEL_GUTTER * (len(rows) - 1)) // len(rows)
+    boxes = []
+    for r, per_row in enumerate(rows):
+        y0 = PAGE_MARGIN + r * (row_h + PANEL_GUTTER)
+        col_w = (width - 2 * PAGE_MARGIN - PANEL_GUTTER * (per_row - 1)) // per_row
+        for c in range(per_row):
+            x0 = PAGE_MARGIN + c * (col_w + PANEL_GUTTER)
+            boxes.append((x0, y0, x0 + col_w, y0 + row_h))
+    return boxes
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+        return [path, stat.st_mtime_ns, stat.st_size]
+    except (OSError, TypeError):
+        return None
+
+def tile_key(panel, art_path, size):
+    payload = {"v": RENDER_VERSION, "panel": {k: panel.get(k) for k in ("description", "dialogue")},
+               "art": file_signature(art_path), "size": list(size)}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+def touch(path):
+    # Bump the LRU clock (at most once an hour, so cache hits stay read-only)
+    try:
+        if time.time() - os.path.getmtime(path) > 3600: os.utime(path)
+    except OSError: pass
+
+def enforce_cache_budget(cache_dir, budget_mb=CACHE_BUDGET_MB):
+    # Oldest tiles/pages go first once the folder is over budget. Other workers
+    # may be pruning too, so files that vanish under us are simply skipped.
+    entries = []
+    for sub in ("tiles", "pages"):
+        try:
+            for entry in os.scandir(os.path.join(cache_dir, sub)):
+                if entry.name.endswith(".tmp"): continue # being written right now
+                try: entries.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+                except OSError: pass
+        except OSError: pass
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= budget_mb * 1024 * 1024: break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError: pass
+
+def paste_art(tile, art_path):
+    # Cover-fit the character art into the panel
+    try:
+        with Image.open(art_path) as art:
+            art = art.convert("RGB")
+            scale = max(tile.width / art.width, tile.height / art.height)
+            art = art.resize((max(1, int(art.width * scale)), max(1, int(art.height * scale))))
+            left, top = (art.width - tile.width) // 2, (art.height - tile.height) // 2
+            tile.paste(art.crop((left, top, left + tile.width, top + tile.height)))
+    except (OSError, ValueError):
+        pass # Missing or broken art -> plain panel
+
+def draw_caption(draw, text, width, font):
+    lines = textwrap.wrap(text, max(10, width // (CAPTION_FONT_SIZE // 2 + 2)))[:4]
+    if not lines: return 0
+    line_h = CAPTION_FONT_SIZE + 6
+    box_h = line_h * len(lines) + 2 * BALLOON_PADDING // 2
+    draw.rectangle((0, 0, width, box_h), fill="#FFFF00", outline="black", width=3)
+    for i, line in enumerate(lines):
+        draw.text((BALLOON_PADDING, BALLOON_PADDING // 2 + i * line_h), line, fill="black", font=font)
+    return box_h
+
+def draw_balloon(draw, speaker, text, x, y, max_w, font, tail_left):
+    # Rounded balloon with a small tail pointing down towards the speaker's side
+    lines = textwrap.wrap(f"{speaker}: {text}", BALLOON_MAX_CHARS)[:6]
+    line_h = FONT_SIZE + 6
+    text_w = max(draw.textlength(line, font=font) for line in lines)
+    w = min(max_w, int(text_w) + 2 * BALLOON_PADDING)
+    h = line_h * len(lines) + 2 * BALLOON_PADDING
+    if not tail_left: x = x + max_w - w
+    draw.rounded_rectangle((x, y, x + w, y + h), radius=24, fill="white", outline="black", width=3)
+    tail_x = x + 30 if tail_left else x + w - 30
+    draw.polygon([(tail_x - 12, y + h - 2), (tail_x + 12, y + h - 2), (tail_x + (-18 if tail_left else 18), y + h + 26)],
+                 fill="white", outline="black")
+    draw.line([(tail_x - 11, y + h - 2), (tail_x + 11, y + h - 2)], fill="white", width=4)
+    for i, line in enumerate(lines):
+        draw.text((x + BALLOON_PADDING, y + BALLOON_PADDING + i * line_h), line, fill="black", font=font)
+    return h + 30
+
+def render_tile(panel, art_path, size):
+    tile = Image.new("RGB", size, "white")
+    if art_path: paste_art(tile, art_path)
+    draw = ImageDraw.Draw(tile)
+    y = draw_caption(draw, " ".join(panel.get("description", [])), size[0], load_font(CAPTION_FONT_SIZE)) + 12
+    font = load_font(FONT_SIZE)
+    # Balloons stack top-down, alternating sides so a conversation reads left/right
+    for i, line in enumerate(panel.get("dialogue", [])):
+        if y > size[1] - 60: break
+        y += draw_balloon(draw, line["speaker"], line["text"], 12, y, size[0] - 24, font, tail_left=(i % 2 == 0)) + 8
+    draw.rectangle((0, 0, size[0] - 1, size[1] - 1), outline="black", width=BORDER)
+    return tile
+
+def save_png(image, path):
+    # Per-process temp name: two workers can draw the same tile at once
+    tmp = f"{path}.{os.getpid()}.tmp"
+    image.save(tmp, "PNG", compress_level=PNG_LEVEL)
+    os.replace(tmp, path)
+
+def get_tile(panel, art_path, size, cache_dir):
+    key = tile_key(panel, art_path, size)
+    path = os.path.join(cache_dir, "tiles", f"{key}.png")
+    if os.path.exists(path):
+        try:
+            with Image.open(path) as cached: tile = cached.convert("RGB")
+            touch(path)
+            return tile, False
+        except OSError:
+            pass # Damaged cache file -> draw it again
+    tile = render_tile(panel, art_path, size)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    save_png(tile, path)
+    return tile, True
+
+def panel_art(panel, art):
+    # The first speaker (or hero named in the description) that has art
+    for line in panel.get("dialogue", []):
+        if line["speaker"].lower() in art: return art[line["speaker"].lower()]
+    text = " ".join(panel.get("description", [])).lower()
+    return next((path for name, path in art.items() if name in text), None)
+
+def render_page(job):
+    # job = {"page": parsed page, "art": {lower-case name: image path}, "cache_dir": folder}
+    # -> {"number", "path", "drawn", "cached"}; runs inside a pool worker
+    page, art, cache_dir = job["page"], job.get("art", {}), job["cache_dir"]
+    boxes = layout_panels(len(page["panels"]))
+    tiles = [(panel, panel_art(panel, art), (x1 - x0, y1 - y0)) for panel, (x0, y0, x1, y1) in zip(page["panels"], boxes)]
+    page_key = hashlib.sha1(json.dumps([tile_key(p, a, s) for p, a, s in tiles] + [page["number"]]).encode("utf-8")).hexdigest()
+    out_path = os.path.join(cache_dir, "pages", f"page_{page['number']:03d}_{page_key[:16]}.png")
+    if os.path.exists(out_path):
+        touch(out_path)
+        return {"number": page["number"], "path": out_path, "drawn": 0, "cached": len(tiles)}
+
+    canvas = Image.new("RGB", PAGE_SIZE, "white")
+    drawn = 0
+    for (panel, art_path, size), (x0, y0, x1, y1) in zip(tiles, boxes):
+        tile, fresh = get_tile(panel, art_path, size, cache_dir)
+        canvas.paste(tile, (x0, y0))
+        drawn += fresh
+    if not tiles:
+        ImageDraw.Draw(canvas).text((PAGE_MARGIN, PAGE_MARGIN), f"PAGE {page['number']} (no panels yet)", fill="black", font=load_font(FONT_SIZE))
+    ImageDraw.Draw(canvas).text((PAGE_SIZE[0] // 2 - 10, PAGE_SIZE[1] - PAGE_MARGIN + 6), str(page["number"]), fill="black", font=load_font(CAPTION_FONT_SIZE))
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    save_png(canvas, out_path)
+    enforce_cache_budget(cache_dir)
+    return {"number": page["number"], "path": out_path, "drawn": drawn, "cached": len(tiles) - drawn}
+
+def render_pages(jobs, pool=None):
+    # Pages are independent -> render them side by side on the process pool
+    if pool is None or len(jobs) < 2: return [render_page(job) for job in jobs]
+    return list(pool.map(render_page, jobs))
+
+def make_pool(workers=None):
+    # "spawn", not fork: forking the multithreaded Streamlit server can deadlock
+    # the child. Spawned workers only import this (Streamlit-free) module.
+    return ProcessPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1), mp_context=multiprocessing.get_context("spawn"))
+
+# --- ISSUE EXPORT ---
+# Pages are recompressed to JPEG on the pool and written to the archive one at a
+# time, in order, as they come back. At most EXPORT_IN_FLIGHT images are held in
+# memory, so a 100-page issue costs about the same RAM as a 5-page one.
+def recompress_image(path):
+    # -> (jpeg bytes, width, height), or None if the file can't be read
+    try:
+        with Image.open(path) as img:
+            img = img.convert("RGB")
+            if img.width > EXPORT_MAX_WIDTH:
+                img = img.resize((EXPORT_MAX_WIDTH, int(img.height * EXPORT_MAX_WIDTH / img.width)))
+            out = io.BytesIO()
+            img.save(out, "JPEG", quality=EXPORT_QUALITY)
+            return out.getvalue(), img.width, img.height
+    except (OSError, ValueError):
+        return None
+
+def bounded_map(pool, fn, items, in_flight=EXPORT_IN_FLIGHT):
+    # Like pool.map, but never more than in_flight results waiting to be consumed
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= in_flight: yield pending.popleft().result()
+    while pending: yield pending.popleft().result()
+
+class PdfStream:
+    # Minimal PDF writer: one full-page JPEG per page, written as it arrives.
+    # (Pillow's PDF plugin collects every page before writing, which is what we avoid.)
+    def __init__(self, f):
+        self.f, self.offsets, self.pages = f, [], []
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.catalog, self.tree = self.reserve(), self.reserve()
+
+    def reserve(self):
+        self.offsets.append(0)
+        return len(self.offsets)
+
+    def write_object(self, num, body, stream=None):
+        self.offsets[num - 1] = self.f.tell()
+        self.f.write(f"{num} 0 obj\n{body}".encode("ascii"))
+        if stream is not None: self.f.write(b"\nstream\n" + stream + b"\nendstream")
+        self.f.write(b"\nendobj\n")
+
+    def add_jpeg(self, data, width, height):
+        image, content, page = self.reserve(), self.reserve(), self.reserve()
+        w, h = round(width * 72 / EXPORT_DPI, 2), round(height * 72 / EXPORT_DPI, 2)
+        self.write_object(image, f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceRGB "
+                                 f"/BitsPerComponent 8 /Filter /DCTDecode /Length {len(data)} >>", data)
+        draw = f"q {w} 0 0 {h} 0 0 cm /Im0 Do Q".encode("ascii")
+        self.write_object(content, f"<< /Length {len(draw)} >>", draw)
+        self.write_object(page, f"<< /Type /Page /Parent {self.tree} 0 R /MediaBox [0 0 {w} {h}] "
+                                f"/Resources << /XObject << /Im0 {image} 0 R >> >> /Contents {content} 0 R >>")
+        self.pages.append(page)
+
+    def close(self):
+        kids = " ".join(f"{p} 0 R" for p in self.pages)
+        self.write_object(self.tree, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>")
+        self.write_object(self.catalog, f"<< /Type /Catalog /Pages {self.tree} 0 R >>")
+        xref = self.f.tell()
+        self.f.write(f"xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n".encode("ascii"))
+        self.f.write("".join(f"{offset:010d} 00000 n \n" for offset in self.offsets).encode("ascii"))
+        self.f.write(f"trailer\n<< /Size {len(self.offsets) + 1} /Root {self.catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii"))
+
+def comic_info(title, count):
+    # ComicInfo.xml: the metadata file CBZ readers look for
+    safe = title.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return f'<?xml version="1.0" encoding="utf-8"?>\n<ComicInfo><Title>{safe}</Title><PageCount>{count}</PageCount></ComicInfo>\n'
+
+def export_issue(paths, out_path, fmt="cbz", title="", pool=None):
+    # paths: page images in reading order -> writes out_path, returns pages written
+    images = bounded_map(pool, recompress_image, paths) if pool else map(recompress_image, paths)
+    count = 0
+    try:
+        with open(out_path + ".tmp", "wb") as f:
+            if fmt == "pdf":
+                pdf = PdfStream(f)
+                for result in images:
+                    if result: pdf.add_jpeg(*result); count += 1
+                pdf.close()
+            else:
+                # JPEGs don't shrink any further -> store them, no deflate pass
+                with zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as zf:
+                    for result in images:
+                        if result: count += 1; zf.writestr(f"{count:03d}.jpg", result[0])
+                    zf.writestr("ComicInfo.xml", comic_info(title, count))
+        os.replace(out_path + ".tmp", out_path)
+    except BaseException:
+        # Half-written archive -> remove it (export pruning never looks at .tmp files)
+        try: os.remove(out_path + ".tmp")
+        except OSError: pass
+        raise
+    return count
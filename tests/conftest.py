@@ -0,0 +1,43 @@
+# Offline tests: comic_app.py is imported (its UI runs in Streamlit's bare mode)
+# with the stub model switched on, inside a throwaway working directory so the
+# real CSVs, caches and saved scripts are never touched (the CSVs are copied in).
+import os
+import sys
+import glob
+import shutil
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    os.environ["COMIC_STUDIO_AI_STUB"] = "1"
+    old_cwd = os.getcwd()
+    studio = tmp_path_factory.mktemp("studio")
+    for f in glob.glob(os.path.join(ROOT, "*.csv")) + [os.path.join(ROOT, "banned_words.txt")]:
+        shutil.copy(f, studio)
+    os.chdir(studio)
+    sys.path.insert(0, ROOT)
+    import comic_app
+    yield comic_app
+    os.chdir(old_cwd)
+
+@pytest.fixture
+def cache(app, tmp_path, monkeypatch):
+    # A fresh response cache + model health per test, wired into generate_ai_content
+    cache = app.ResponseCache(str(tmp_path / "ai_cache.db"))
+    health = app.ModelHealth()
+    monkeypatch.setattr(app, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(app, "get_model_health", lambda: health)
+    return cache
+
+@pytest.fixture
+def model_calls(app, monkeypatch):
+    # Counts hedged (blocking) model attempts; the stub still answers them
+    calls = []
+    real_attempt = app.run_attempt
+    def counting_attempt(model_name, *args):
+        calls.append(model_name)
+        return real_attempt(model_name, *args)
+    monkeypatch.setattr(app, "run_attempt", counting_attempt)
+    return calls
@@ -0,0 +1,47 @@
+import time
+
+def test_normalized_prompt_hits_cache(app, cache, model_calls):
+    first = app.generate_ai_content("Pitch a   hero  called Cipher")
+    again = app.generate_ai_content("pitch a hero\ncalled CIPHER ")
+    assert again == first
+    assert len(model_calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_different_prompt_misses(app, cache, model_calls):
+    app.generate_ai_content("Pitch a hero called Cipher")
+    app.generate_ai_content("Pitch a hero called Zora")
+    assert len(model_calls) == 2
+    assert (cache.hits, cache.misses) == (0, 2)
+
+def test_settings_are_part_of_the_key(app, cache, model_calls):
+    app.generate_ai_content("Pitch a hero", temperature=0.2)
+    app.generate_ai_content("Pitch a hero", temperature=0.9)
+    assert len(model_calls) == 2
+
+def test_expired_entry_is_dropped(app, cache, model_calls, monkeypatch):
+    app.generate_ai_content("Pitch a hero")
+    monkeypatch.setattr(app, "AI_CACHE_TTL", -1)
+    app.generate_ai_content("Pitch a hero")
+    assert len(model_calls) == 2
+    assert cache.stats()["entries"] == 1
+
+def test_least_recently_used_entry_is_evicted(app, cache, monkeypatch):
+    monkeypatch.setattr(app, "AI_CACHE_MAX_ENTRIES", 2)
+    cache.put("a", "stub", "A")
+    time.sleep(0.01)
+    cache.put("b", "stub", "B")
+    time.sleep(0.01)
+    assert cache.get("a") == "A" # "a" is now the most recently used
+    time.sleep(0.01)
+    cache.put("c", "stub", "C")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+
+def test_use_cache_false_bypasses_lookup_but_stores(app, cache, model_calls):
+    app.generate_ai_content("Pitch a hero")
+    app.generate_ai_content("Pitch a hero", use_cache=False)
+    assert len(model_calls) == 2
+    assert cache.hits == 0
+    app.generate_ai_content("Pitch a hero")
+    assert len(model_calls) == 2
+    assert cache.hits == 1
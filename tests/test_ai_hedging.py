@@ -0,0 +1,53 @@
+import time
+import pytest
+
+def slow_models(first_chunk_after, closed):
+    # Fake streaming models: each waits its own time before the first chunk,
+    # then streams slowly; `closed` records streams hung up before the end
+    def call_model_stream(model_name, prompt, settings):
+        time.sleep(first_chunk_after.get(model_name, 0))
+        try:
+            for word in ["one ", "two ", "three ", "four ", "five"]:
+                yield word
+                time.sleep(0.05)
+        except GeneratorExit:
+            closed.append(model_name)
+            raise
+    return call_model_stream
+
+def test_no_hedge_while_the_first_model_is_talking(app, cache, model_calls, monkeypatch):
+    closed = []
+    monkeypatch.setattr(app, "call_model_stream", slow_models({}, closed))
+    # The whole answer takes ~0.25 s, longer than the hedge delay, but the first
+    # chunk comes straight away -> no second paid request
+    model_name, answer = app.race_models("Pitch a hero", {}, hedge_delay=0.1)
+    assert (model_name, answer) == (app.AI_MODELS[0], "one two three four five")
+    assert model_calls == [app.AI_MODELS[0]]
+
+def test_slow_starter_is_hedged_and_then_hung_up(app, cache, model_calls, monkeypatch):
+    closed = []
+    first, second = app.AI_MODELS[:2]
+    monkeypatch.setattr(app, "call_model_stream", slow_models({first: 0.4}, closed))
+    model_name, answer = app.race_models("Pitch a hero", {}, hedge_delay=0.1)
+    assert model_name == second
+    assert model_calls == [first, second]
+    time.sleep(0.3) # let the loser reach its first chunk
+    assert closed == [first] # stopped after one chunk, not run to the end
+
+def test_failure_falls_back_without_waiting(app, cache, model_calls, monkeypatch):
+    def call_model_stream(model_name, prompt, settings):
+        if model_name == app.AI_MODELS[0]: raise ConnectionError("model down")
+        yield "fine"
+    monkeypatch.setattr(app, "call_model_stream", call_model_stream)
+    started = time.time()
+    assert app.race_models("Pitch a hero", {}, hedge_delay=5) == (app.AI_MODELS[1], "fine")
+    assert time.time() - started < 1
+    assert app.get_model_health().failures[app.AI_MODELS[0]] == 1
+
+def test_all_models_failing_raises(app, cache, monkeypatch):
+    def call_model_stream(model_name, prompt, settings):
+        raise ConnectionError(f"{model_name} down")
+        yield
+    monkeypatch.setattr(app, "call_model_stream", call_model_stream)
+    with pytest.raises(RuntimeError):
+        app.race_models("Pitch a hero", {}, hedge_delay=5)
@@ -0,0 +1,41 @@
+import pytest
+
+PROMPT = "Write a one-line origin for Cipher"
+
+def broken_stream(app, after):
+    # Fake streaming model: the first stream drops after `after` chunks, later calls work
+    streams = []
+    def call_model_stream(model_name, prompt, settings):
+        streams.append(model_name)
+        for i, chunk in enumerate(app.StubModel(model_name).generate_content(prompt, stream=True)):
+            if i == after and len(streams) == 1: raise ConnectionError("stream reset")
+            yield chunk.text
+    return call_model_stream
+
+def test_stream_chunks_join_to_full_answer(app, cache, model_calls):
+    chunks = list(app.generate_ai_content(PROMPT, stream=True))
+    assert len(chunks) > 1
+    assert model_calls == [] # streamed, no hedged call
+    assert "".join(chunks) == app.generate_ai_content(PROMPT, use_cache=False)
+    assert cache.get(cache.make_key(PROMPT, {"temperature": None})) == "".join(chunks)
+
+def test_cached_stream_yields_one_chunk(app, cache, model_calls):
+    first = "".join(app.generate_ai_content(PROMPT, stream=True))
+    assert list(app.generate_ai_content(PROMPT, stream=True)) == [first]
+    assert cache.hits == 1
+
+@pytest.mark.parametrize("after", [0, 3])
+def test_broken_stream_falls_back_once(app, cache, model_calls, monkeypatch, after):
+    full = app.StubModel(app.AI_MODELS[0]).generate_content(PROMPT).text
+    monkeypatch.setattr(app, "call_model_stream", broken_stream(app, after))
+    chunks = list(app.generate_ai_content(PROMPT, stream=True))
+    assert "".join(chunks) == full # what already arrived isn't repeated
+    assert len(model_calls) == 1
+
+def test_fallback_failure_reports_cut_off(app, cache, monkeypatch):
+    monkeypatch.setattr(app, "call_model_stream", broken_stream(app, 3))
+    def down(full_prompt, settings, hedge_delay): raise RuntimeError("all models down")
+    monkeypatch.setattr(app, "race_models", down)
+    chunks = list(app.generate_ai_content(PROMPT, stream=True))
+    assert len(chunks) == 4
+    assert "TRANSMISSION CUT OFF" in chunks[-1]
@@ -0,0 +1,17 @@
+def test_pending_stays_bounded_while_summaries_fail(app, monkeypatch):
+    monkeypatch.setattr(app, "generate_ai_content", lambda prompt, **kw: "⚠️ **CONNECTION FAILED.** Error Code: down")
+    memory = app.ChatMemory("universe_test.csv", "CIPHER")
+    for turn in range(50):
+        memory.add("user", f"message {turn}")
+        memory.update_summary()
+    assert len(memory.pending) == app.CHAT_PENDING_MAX
+    assert memory.pending[-1]["text"] == f"message {49 - app.CHAT_RECENT_TURNS}" # newest overflow kept
+    assert "message 0\n" not in memory.prompt_block()
+
+def test_pending_is_folded_once_summaries_work(app, monkeypatch):
+    monkeypatch.setattr(app, "generate_ai_content", lambda prompt, **kw: "Joe likes kites.")
+    memory = app.ChatMemory("universe_test.csv", "CIPHER")
+    for turn in range(app.CHAT_RECENT_TURNS + app.CHAT_SUMMARY_BATCH):
+        memory.add("user", f"message {turn}")
+    memory.update_summary()
+    assert memory.pending == [] and memory.summary == "Joe likes kites."
@@ -0,0 +1,54 @@
+import os
+import pytest
+import comic_pages
+
+PAGE = {"number": 1, "notes": [], "panels": [
+    {"number": 1, "description": ["The city at night."], "dialogue": [{"speaker": "CIPHER", "note": "", "text": "Grid's down."}]},
+    {"number": 2, "description": ["Rooftops."], "dialogue": []}]}
+
+def test_second_render_reuses_the_page(tmp_path):
+    job = {"page": PAGE, "art": {}, "cache_dir": str(tmp_path)}
+    first = comic_pages.render_page(job)
+    assert (first["drawn"], first["cached"]) == (2, 0)
+    again = comic_pages.render_page(job)
+    assert again["path"] == first["path"] and again["drawn"] == 0
+
+def test_budget_evicts_least_recently_used_first(tmp_path):
+    os.makedirs(tmp_path / "tiles")
+    os.makedirs(tmp_path / "pages")
+    for i, name in enumerate(["tiles/old.png", "pages/mid.png", "tiles/new.png"]):
+        (tmp_path / name).write_bytes(b"x" * 400 * 1024)
+        os.utime(tmp_path / name, (1000 + i, 1000 + i))
+    (tmp_path / "tiles" / "busy.png.tmp").write_bytes(b"x" * 400 * 1024)
+    comic_pages.enforce_cache_budget(str(tmp_path), budget_mb=1)
+    assert not (tmp_path / "tiles" / "old.png").exists()
+    assert (tmp_path / "pages" / "mid.png").exists() and (tmp_path / "tiles" / "new.png").exists()
+    assert (tmp_path / "tiles" / "busy.png.tmp").exists() # in-flight writes are left alone
+
+def test_failed_export_leaves_no_tmp_file(tmp_path, monkeypatch):
+    def broken(path): raise OSError("disk full")
+    monkeypatch.setattr(comic_pages, "recompress_image", broken)
+    for fmt in ["cbz", "pdf"]:
+        out = str(tmp_path / f"issue.{fmt}")
+        with pytest.raises(OSError):
+            comic_pages.export_issue(["page.png"], out, fmt)
+        assert os.listdir(tmp_path) == []
+
+def test_export_writes_every_readable_page(tmp_path):
+    from PIL import Image
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / f"p{i}.png"))
+        Image.new("RGB", (200, 300), "white").save(paths[-1])
+    assert comic_pages.export_issue(paths + [str(tmp_path / "missing.png")], str(tmp_path / "issue.cbz"), "cbz", title="Issue 1") == 3
+    assert comic_pages.export_issue(paths, str(tmp_path / "issue.pdf"), "pdf") == 3
+    assert open(tmp_path / "issue.pdf", "rb").read().rstrip().endswith(b"%%EOF")
+
+def test_pool_workers_are_spawned(tmp_path):
+    pool = comic_pages.make_pool(2)
+    try:
+        assert pool._mp_context.get_start_method() == "spawn"
+        jobs = [{"page": dict(PAGE, number=n), "art": {}, "cache_dir": str(tmp_path)} for n in (1, 2)]
+        assert [r["number"] for r in comic_pages.render_pages(jobs, pool)] == [1, 2]
+    finally:
+        pool.shutdown()
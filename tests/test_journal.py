@@ -0,0 +1,22 @@
+import os
+import pandas as pd
+
+COLUMNS = ["Year", "Event", "Type"]
+
+def test_deleted_file_gets_its_header_back(app, tmp_path):
+    journal = app.TableJournal()
+    path = str(tmp_path / "timeline.csv")
+    journal.append(path, COLUMNS, {"Year": "2001", "Event": "first", "Type": "Event"})
+    os.remove(path)
+    journal.append(path, COLUMNS, {"Year": "2002", "Event": "second", "Type": "Event"})
+    df = pd.read_csv(path, dtype=str)
+    assert list(df.columns) == COLUMNS
+    assert df["Event"].tolist() == ["second"]
+
+def test_emptied_file_gets_its_header_back(app, tmp_path):
+    journal = app.TableJournal()
+    path = str(tmp_path / "security_log.csv")
+    journal.append(path, COLUMNS, {"Year": "2001", "Event": "first", "Type": "Event"})
+    open(path, "w").close()
+    journal.append(path, COLUMNS, {"Year": "2002", "Event": "second", "Type": "Event"})
+    assert pd.read_csv(path, dtype=str)["Event"].tolist() == ["second"]
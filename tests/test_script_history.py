@@ -0,0 +1,48 @@
+import os
+import glob
+
+def test_stats_running_totals_match_the_object_store(app):
+    history = app.ScriptHistory()
+    os.makedirs(app.HISTORY_DIR, exist_ok=True)
+    history.record("totals.txt", "[PAGE 1]\nPANEL 1\nA: one\n")
+    before = history.stats() # counted from disk once
+    history.record("totals.txt", "[PAGE 1]\nPANEL 1\nA: one\n[PAGE 2]\nPANEL 1\nB: two\n")
+    files = glob.glob(os.path.join(app.HISTORY_OBJECTS, "*", "*"))
+    assert history.stats() == {"objects": len(files), "bytes": sum(os.path.getsize(f) for f in files)}
+    assert history.stats()["objects"] == before["objects"] + 1 # page 1 is shared
+
+def test_diff_only_shows_changed_pages(app):
+    history = app.ScriptHistory()
+    os.makedirs(app.HISTORY_DIR, exist_ok=True)
+    pages = "".join(f"[PAGE {i}]\nPANEL 1\nA: line {i}\n" for i in range(1, 6))
+    history.record("diff.txt", pages)
+    history.record("diff.txt", pages.replace("line 4", "line FOUR"))
+    changes = history.diff("diff.txt", 1, 2)
+    assert "-A: line 4" in changes and "+A: line FOUR" in changes
+    assert "line 2" not in changes
+
+def test_edits_are_stored_as_small_deltas(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "HISTORY_DIR", str(tmp_path))
+    monkeypatch.setattr(app, "HISTORY_OBJECTS", str(tmp_path / "objects"))
+    history = app.ScriptHistory()
+    # ~31 KB with no [PAGE n] headings -> a single segment
+    lines = [f"Line {i}: CIPHER types furiously while the city hums below.\n" for i in range(520)]
+    history.record("unpaged.txt", "".join(lines))
+    first = history.stats()["bytes"]
+    texts = []
+    for edit in range(30):
+        lines[(edit * 37) % len(lines)] = f"Edited line {edit}.\n"
+        texts.append("".join(lines))
+        history.record("unpaged.txt", texts[-1])
+    assert history.stats()["bytes"] - first < 30 * 200 # a few hundred bytes per edit, not a full copy
+    for version, text in enumerate(texts, start=2): # deltas (past the chain limit too) load back exactly
+        assert history.load("unpaged.txt", version) == text
+
+def test_only_explicit_saves_make_versions(app):
+    app.save_script_file("Autosaved", "[PAGE 1]\nPANEL 1\nA: one\n")
+    for n in range(3):
+        app.save_script_file("Autosaved", f"[PAGE 1]\nPANEL 1\nA: one {n}\n", autosave=True)
+    assert len(app.get_script_history().versions("Autosaved.txt")) == 1
+    assert app.load_script_file("Autosaved.txt").endswith("one 2\n")
+    app.save_script_file("Autosaved", app.load_script_file("Autosaved.txt"))
+    assert len(app.get_script_history().versions("Autosaved.txt")) == 2
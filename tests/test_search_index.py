@@ -0,0 +1,38 @@
+import sqlite3
+
+def test_put_replaces_and_remove_deletes(app, tmp_path):
+    index = app.SearchIndex(str(tmp_path / "search.db"))
+    index.put("script", "a.txt", "A", "Faraday builds a cage")
+    index.put("script", "a.txt", "A", "Faraday builds a bigger cage")
+    index.put("script", "b.txt", "B", "Zora flies")
+    assert index.count() == 2
+    assert [r[1] for r in index.search("bigger")] == ["a.txt"]
+    index.remove("script", "a.txt")
+    assert index.search("faraday") == []
+    assert index.count() == 1
+
+def test_updates_go_through_the_rowid_map(app, tmp_path):
+    index = app.SearchIndex(str(tmp_path / "search.db"))
+    index.put("script", "a.txt", "A", "text")
+    plan = " ".join(r[-1] for r in index.connect().execute(
+        "EXPLAIN QUERY PLAN SELECT fts_rowid FROM doc_map WHERE kind = ? AND doc_id = ?", ("script", "a.txt")))
+    assert "USING INDEX" in plan
+
+def test_index_from_before_doc_map_is_migrated(app, tmp_path):
+    path = str(tmp_path / "old.db")
+    with sqlite3.connect(path) as con:
+        con.execute("CREATE VIRTUAL TABLE docs USING fts5(kind UNINDEXED, doc_id UNINDEXED, title, body)")
+        con.execute("INSERT INTO docs VALUES ('script', 'a.txt', 'A', 'old text')")
+    index = app.SearchIndex(path)
+    index.put("script", "a.txt", "A", "new text")
+    assert index.count() == 1
+    assert index.search("old") == []
+
+def test_rebuild_indexes_every_document_once(app, tmp_path, monkeypatch):
+    index = app.SearchIndex(str(tmp_path / "search.db"))
+    docs = [("timeline", "2001|x", "2001", "same event"), ("timeline", "2001|x", "2001", "same event"),
+            ("script", "a.txt", "A", "Faraday")]
+    monkeypatch.setattr(index, "documents", lambda: iter(docs))
+    assert index.rebuild() == 2
+    index.put("script", "a.txt", "A", "Zora")
+    assert index.count() == 2 and index.search("faraday") == []
@@ -0,0 +1,21 @@
+import gzip
+import datetime as dt
+
+class FrozenClock(dt.datetime):
+    @classmethod
+    def now(cls, tz=None): return cls(2026, 1, 1, 12, 0, 0, 0)
+
+def test_rotations_in_the_same_instant_keep_both_archives(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "LOG_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(app, "LOG_INDEX_FILE", str(tmp_path / "archive" / "index.json"))
+    monkeypatch.setattr(app, "log_needs_rotation", lambda path: True)
+    monkeypatch.setattr(app, "datetime", FrozenClock)
+    log = tmp_path / "security_log.csv"
+    for event in ["PROFANITY", "COPYRIGHT"]:
+        log.write_text(f"Timestamp,Type,Input\n2026-01-01 12:00:00,{event},x\n", encoding="utf-8")
+        assert app.rotate_security_log(str(log))
+    index = app.load_log_index()
+    assert len(index) == 2
+    for name, entry in index.items():
+        with gzip.open(tmp_path / "archive" / name, "rt", encoding="utf-8") as f:
+            assert list(entry["types"])[0] in f.read()
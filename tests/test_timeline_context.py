@@ -0,0 +1,33 @@
+import pandas as pd
+
+TIMELINE = pd.DataFrame({"Year": ["1990", "2010", "2012"],
+                         "Event": ["Cipher hacks the city grid", "Zora is born in the storm", "Cipher meets Zora"]})
+
+def test_precheck_rejects_character_before_intro(app):
+    context = app.TimelineContext()
+    context.refresh(TIMELINE, ["CIPHER", "ZORA"])
+    assert context.precheck("ZORA fights crime", 2000)[0] == "reject"
+
+def test_new_roster_name_rebuilds_intro_index(app):
+    context = app.TimelineContext()
+    context.refresh(TIMELINE, ["CIPHER"])
+    assert context.introduced == {}
+    context.refresh(TIMELINE, ["CIPHER", "ZORA"]) # same timeline, new hero
+    assert context.introduced == {"zora": 2010}
+    assert context.precheck("ZORA fights crime", 2000)[0] == "reject"
+
+def test_precheck_duplicate_and_quiet_year(app):
+    context = app.TimelineContext()
+    context.refresh(TIMELINE, ["CIPHER", "ZORA"])
+    assert context.precheck("cipher HACKS the city grid!", 2020)[0] == "reject"
+    assert context.precheck("A comet passes", 1900)[0] == "accept"
+    assert context.precheck("Cipher retires", 2011)[0] == "escalate"
+
+def test_travel_and_lore_words_are_not_introductions(app):
+    timeline = pd.DataFrame({"Year": ["2015", "2016"],
+                             "Event": ["CIPHER arrives in Paris", "SKETCH learns the origin of his stylus"]})
+    context = app.TimelineContext()
+    context.refresh(timeline, ["CIPHER", "SKETCH"])
+    assert context.introduced == {}
+    assert context.precheck("CIPHER hacks the city grid", 2012)[0] != "reject"
+    assert context.precheck("SKETCH draws a door", 2012)[0] != "reject"